@@ -17,6 +17,7 @@ from IPython.display import display, Image
 
 from dotenv import load_dotenv
 
+import asyncio
 import re
 
 load_dotenv(dotenv_path="../.env.local")
@@ -48,7 +49,7 @@ class State(MessagesState):
     next: str
 
 
-def supervisor_node(state: State) -> Command[Literal["pharmacist", "researcher", "medical_analyst", "__end__"]]:
+async def supervisor_node(state: State) -> Command[Literal["pharmacist", "researcher", "medical_analyst", "__end__"]]:
     messages = [
         {"role": "system", "content": system_prompt},
     ] + state["messages"]
@@ -58,7 +59,7 @@ def supervisor_node(state: State) -> Command[Literal["pharmacist", "researcher",
         if 'name' in message:
             message['name'] = re.sub(r'[^a-zA-Z0-9_-]', '_', message['name'])
 
-    response = llm.with_structured_output(Router).invoke(messages)
+    response = await llm.with_structured_output(Router).ainvoke(messages)
     goto = response["next"]
     if goto == "FINISH":
         goto = END
@@ -71,8 +72,9 @@ pharamcist_agent = create_react_agent(
 )
 
 
-def pharmacist_node(state: State) -> Command[Literal["supervisor"]]:
-    result = pharamcist_agent.invoke(state)
+async def pharmacist_node(state: State) -> Command[Literal["supervisor"]]:
+    # The agents' tools are async-only, so they have to be awaited
+    result = await pharamcist_agent.ainvoke(state)
     return Command(
         update={
             "messages": [
@@ -90,8 +92,8 @@ researcher_agent = create_react_agent(
 medical_analyst_agent = create_react_agent(llm, tools=[search_wikem])
 
 
-def medical_analyst_node(state: State) -> Command[Literal["supervisor"]]:
-    result = medical_analyst_agent.invoke(state)
+async def medical_analyst_node(state: State) -> Command[Literal["supervisor"]]:
+    result = await medical_analyst_agent.ainvoke(state)
     return Command(
         update={
             "messages": [
@@ -102,8 +104,8 @@ def medical_analyst_node(state: State) -> Command[Literal["supervisor"]]:
             goto="supervisor",
     )
 
-def researcher_node(state: State) -> Command[Literal["supervisor"]]:
-    result = researcher_agent.invoke(state)
+async def researcher_node(state: State) -> Command[Literal["supervisor"]]:
+    result = await researcher_agent.ainvoke(state)
     return Command(
         update={
             "messages": [
@@ -126,16 +128,21 @@ with open("graph_image.png", "wb") as f:
     f.write(graph_image)
 
 
-for s in graph.stream(
-    {
-        "messages": [
-            (
-                "user",
-                "What are some current trends in medical imaging?",
-            )
-        ]
-    },
-    subgraphs=True,
-):
-    print(s)
-    print("----")
\ No newline at end of file
+async def main():
+    async for s in graph.astream(
+        {
+            "messages": [
+                (
+                    "user",
+                    "What are some current trends in medical imaging?",
+                )
+            ]
+        },
+        subgraphs=True,
+    ):
+        print(s)
+        print("----")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -10,7 +10,7 @@ import os
 import json
 import logging
 import asyncio
-import requests
+import httpx
 from typing import Any, Dict, List, Optional, Union
 from urllib.parse import urlparse
 
@@ -98,20 +98,29 @@ class FHIRServer:
             tools={}
         )
         
-        # Set up HTTP session for FHIR requests
-        self.session = requests.Session()
-        self.session.headers.update({
+        # Set up a pooled async HTTP client for FHIR requests, shared by all
+        # tool calls so they reuse keep-alive connections without blocking
+        # the event loop
+        headers = {
             "Content-Type": "application/fhir+json",
             "Accept": "application/fhir+json",
-        })
+        }
         
         if self.access_token:
-            self.session.headers.update({
-                "Authorization": f"Bearer {self.access_token}"
-            })
+            headers["Authorization"] = f"Bearer {self.access_token}"
+        
+        self.client = httpx.AsyncClient(
+            headers=headers,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        )
         
         # Cache for capability statement
         self.capability_statement = None
+    
+    async def aclose(self):
+        """Close the HTTP client and its pooled connections."""
+        await self.client.aclose()
         
     async def handle_request(self, request: JSONRPCRequest) -> JSONRPCResponse:
         """Handle an incoming MCP request."""
@@ -152,7 +161,7 @@ class FHIRServer:
     async def get_capability_statement(self) -> Dict[str, Any]:
         """Fetch and cache the FHIR capability statement."""
         if self.capability_statement is None:
-            response = self.session.get(f"{self.base_url}/metadata")
+            response = await self.client.get(f"{self.base_url}/metadata")
             response.raise_for_status()
             self.capability_statement = response.json()
         return self.capability_statement
@@ -200,7 +209,7 @@ class FHIRServer:
             )
         
         try:
-            response = self.session.get(f"{self.base_url}/{resource_type}/{resource_id}")
+            response = await self.client.get(f"{self.base_url}/{resource_type}/{resource_id}")
             response.raise_for_status()
             resource_data = response.json()
             
@@ -218,7 +227,7 @@ class FHIRServer:
                 id=request.id,
                 result=result.dict()
             )
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
             return JSONRPCResponse(
                 id=request.id,
                 error={"code": -32603, "message": f"Failed to fetch FHIR resource: {str(e)}"}
@@ -398,7 +407,7 @@ class FHIRServer:
             )
         
         try:
-            response = self.session.get(f"{self.base_url}/{resource_type}", params=search_params)
+            response = await self.client.get(f"{self.base_url}/{resource_type}", params=search_params)
             response.raise_for_status()
             search_results = response.json()
             
@@ -415,7 +424,7 @@ class FHIRServer:
                 id=request_id,
                 result=result.dict()
             )
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
             return JSONRPCResponse(
                 id=request_id,
                 error={"code": -32603, "message": f"Failed to search FHIR resources: {str(e)}"}
@@ -436,7 +445,7 @@ class FHIRServer:
         resource_id = url.path.lstrip("/")
         
         try:
-            response = self.session.get(f"{self.base_url}/{resource_type}/{resource_id}")
+            response = await self.client.get(f"{self.base_url}/{resource_type}/{resource_id}")
             response.raise_for_status()
             resource_data = response.json()
             
@@ -453,7 +462,7 @@ class FHIRServer:
                 id=request_id,
                 result=result.dict()
             )
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
             return JSONRPCResponse(
                 id=request_id,
                 error={"code": -32603, "message": f"Failed to fetch FHIR resource: {str(e)}"}
@@ -470,7 +479,7 @@ class FHIRServer:
             )
         
         try:
-            response = self.session.get(f"{self.base_url}/Patient/{patient_id}")
+            response = await self.client.get(f"{self.base_url}/Patient/{patient_id}")
             response.raise_for_status()
             patient_data = response.json()
             
@@ -504,7 +513,7 @@ class FHIRServer:
                 id=request_id,
                 result=result.dict()
             )
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
             return JSONRPCResponse(
                 id=request_id,
                 error={"code": -32603, "message": f"Failed to fetch patient demographics: {str(e)}"}
@@ -522,7 +531,7 @@ class FHIRServer:
         
         try:
             # Get MedicationRequest resources for this patient
-            response = self.session.get(
+            response = await self.client.get(
                 f"{self.base_url}/MedicationRequest",
                 params={"patient": patient_id, "_include": "MedicationRequest:medication"}
             )
@@ -558,7 +567,7 @@ class FHIRServer:
                 id=request_id,
                 result=result.dict()
             )
-        except requests.exceptions.RequestException as e:
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
             return JSONRPCResponse(
                 id=request_id,
                 error={"code": -32603, "message": f"Failed to fetch medication list: {str(e)}"}
@@ -604,6 +613,8 @@ async def stdio_transport_main():
                 await writer.drain()
         except Exception as e:
             logger.exception(f"Error processing request: {e}")
+    
+    await server.aclose()
 
 class FHIRMCPServer:
     """
@@ -655,6 +666,10 @@ class FHIRMCPServer:
             logger.error(f"Failed to initialize FHIR MCP server: {e}")
             return False
     
+    async def close(self):
+        """Close the underlying FHIR server's HTTP connections."""
+        await self.server.aclose()
+    
     async def list_resources(self, uri_pattern: str, mime_type: Optional[str]) -> List[str]:
         """
         List available FHIR resources.
@@ -10,9 +10,15 @@ import json
 import logging
 import tempfile
 import subprocess
+from contextlib import contextmanager
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Tuple, Union
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
 logger = logging.getLogger(__name__)
 
 class MCPInstaller:
@@ -81,13 +87,47 @@ class MCPInstaller:
             logger.error(f"Error loading config: {e}")
             return {"mcpServers": {}}
     
+    @contextmanager
+    def _config_lock(self):
+        """Serialize config writers across processes (no-op where flock is unavailable)."""
+        if fcntl is None:
+            yield
+            return
+        lock_path = self.config_path.with_suffix(self.config_path.suffix + ".lock")
+        with open(lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
     def _save_config(self, config: Dict[str, Any]) -> None:
-        """Save the MCP servers configuration file."""
+        """
+        Save the MCP servers configuration file.
+        
+        The config is written to a temporary file in the same directory and
+        moved into place with os.replace, so readers never see a truncated
+        file and a crash mid-write leaves the previous config intact.
+        """
+        tmp_path = None
         try:
-            with open(self.config_path, 'w') as f:
-                json.dump(config, f, indent=2)
+            with self._config_lock():
+                fd, tmp_path = tempfile.mkstemp(
+                    prefix=self.config_path.name + ".",
+                    suffix=".tmp",
+                    dir=str(self.config_path.parent)
+                )
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(config, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.config_path)
+                tmp_path = None
         except Exception as e:
             logger.error(f"Error saving config: {e}")
+        finally:
+            if tmp_path and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
     
     async def install_mcp_server(self, 
                                server_name: str, 
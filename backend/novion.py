@@ -1,40 +1,47 @@
-from typing import Literal, AsyncGenerator, List, Optional, Dict, Any, Union, TypeVar, Generic
+from typing import Annotated, Literal, AsyncGenerator, List, Optional, Dict, Any, Union
 from typing_extensions import TypedDict
-from dataclasses import dataclass
+import operator
 
 from langchain_openai import ChatOpenAI
 
 from langchain_core.messages import HumanMessage, BaseMessage
+from langchain_core.runnables import RunnableConfig
 from langgraph.graph import StateGraph, START, END
+from langgraph.graph.state import CompiledStateGraph
 from langgraph.prebuilt import create_react_agent
 from langchain.agents import Tool
 
-# Define our own Command class since langgraph.types is not available
-T = TypeVar('T')
-
-@dataclass
-class Command(Generic[T]):
-    """A command to update state and go to a node."""
-    goto: T
-    update: Dict[str, Any] = None
+try:
+    from langgraph.types import Send
+except ImportError:  # older langgraph releases
+    from langgraph.constants import Send
 
 from tools.medications import get_drug_use_cases, search_drugs_for_condition
 from tools.medical_info import search_wikem
 from tools.researcher import search_pubmed, fetch_pubmed_details, get_pubmed_identifiers, get_pmc_link, retrieve_article_text
 
-from IPython.display import display, Image
-
 from dotenv import load_dotenv
-import json
+import httpx
+import orjson
 import asyncio
+import functools
+import logging
 import os
 import re
 
+try:
+    import h2  # noqa: F401  (needed by httpx for HTTP/2)
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
 # Import MCP integration components
-from mcp.agent_integration import enhance_agent_with_mcp, MCPToolkit
+from mcp.agent_integration import enhance_agent_with_mcp
 
 load_dotenv(dotenv_path="../.env.local")
 
+logger = logging.getLogger(__name__)
+
 # Set up MCP-related environment variables if not already set
 if not os.getenv("FHIR_BASE_URL"):
     os.environ["FHIR_BASE_URL"] = os.getenv("FHIR_BASE_URL", "https://hapi.fhir.org/baseR4")
@@ -43,54 +50,131 @@ if not os.getenv("FHIR_ACCESS_TOKEN"):
     os.environ["FHIR_ACCESS_TOKEN"] = os.getenv("FHIR_ACCESS_TOKEN", "")
 
 members = ["pharmacist", "researcher", "medical_analyst"]
-# Our team supervisor is an LLM node. It just picks the next agent to process
-# and decides when the work is completed
-options = members + ["FINISH"]
+# The workers consume the same query and answer independently, so the
+# supervisor fans the request out to all of them in parallel and a
+# synthesizer node collects the results. The supervisor LLM is only
+# consulted as an optional pre-filter that can narrow down the workers.
+SUPERVISOR_PREFILTER = os.getenv("SUPERVISOR_PREFILTER", "").lower() in ("1", "true", "yes")
+# Whether the agents get MCP (FHIR) tools when a request doesn't say; on unless
+# MCP_ENABLED is set to something else, and changed at runtime through
+# enable_disable_mcp(). Requests can override it via process_query/stream_query
+MCP_ENABLED = os.getenv("MCP_ENABLED", "true").lower() in ("1", "true", "yes")
+# Upper bound on agent runs in flight across all requests, so bursts of
+# traffic don't all hit the provider at once
+MAX_PARALLEL_AGENTS = int(os.getenv("MAX_PARALLEL_AGENTS", "6"))
+_agent_semaphore = asyncio.Semaphore(MAX_PARALLEL_AGENTS)
 
 system_prompt = (
     "You are a supervisor tasked with managing a conversation between the"
     f" following workers: {members}. Given the following user request,"
-    " respond with the worker to act next. Each worker will perform a"
-    " task and respond with their results and status. When finished,"
-    " respond with FINISH."
+    " respond with the workers that should act on it. The selected workers"
+    " run in parallel and each responds with their results and status."
 )
+# Built once so every supervisor request starts with a byte-identical prefix,
+# which is what OpenAI's automatic prompt caching keys on
+_SYSTEM_MSG = {"role": "system", "content": system_prompt}
 
 
 class Router(TypedDict):
-    """Worker to route to next. If no workers needed, route to FINISH."""
+    """Workers to dispatch the request to. Include every worker that could contribute."""
+
+    workers: List[Literal["pharmacist", "researcher", "medical_analyst"]]
+
+
+# Keyword heuristics for requests that obviously belong to a single worker.
+# Part of the SUPERVISOR_PREFILTER narrowing: when exactly one of them
+# matches, the supervisor LLM call is skipped.
+_PHARM_RE = re.compile(
+    r"\b(drugs?|medications?|medicines?|dose|doses|dosage|dosing|mg|prescri\w*"
+    r"|side effects?|interactions?|contraindicat\w*|pharmac\w*)\b",
+    re.IGNORECASE,
+)
+_RESEARCH_RE = re.compile(
+    r"\b(pubmed|pmc|pmid|study|studies|trials?|papers?|literature|research"
+    r"|evidence|meta-analys[ie]s|publications?)\b",
+    re.IGNORECASE,
+)
+_ANALYST_RE = re.compile(
+    r"\b(diagnos\w*|symptoms?|differential|presentation|work-?up|prognosis"
+    r"|management|conditions?)\b",
+    re.IGNORECASE,
+)
+_WORKER_PATTERNS = (
+    ("pharmacist", _PHARM_RE),
+    ("researcher", _RESEARCH_RE),
+    ("medical_analyst", _ANALYST_RE),
+)
 
-    next: Literal["pharmacist", "researcher", "medical_analyst", "FINISH"]
 
+# The LLM client, agents and compiled graph are built on first use rather than
+# at import, so importing this module (every uvicorn worker, tests) stays cheap
+@functools.cache
+def _get_http_client() -> httpx.AsyncClient:
+    # One pooled client for every agent, so parallel calls reuse keep-alive
+    # connections (multiplexed over HTTP/2 when h2 is installed)
+    return httpx.AsyncClient(
+        http2=_HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_keepalive_connections=64, max_connections=128),
+        timeout=60,
+    )
 
-llm = ChatOpenAI(model="gpt-4o-mini")
 
-# Create MCP toolkit for use with agents
-mcp_toolkit = MCPToolkit()
-mcp_tools = mcp_toolkit.get_tools()
+@functools.cache
+def _get_llm() -> ChatOpenAI:
+    return ChatOpenAI(model="gpt-4o-mini", http_async_client=_get_http_client())
+
+
+@functools.cache
+def _get_router_llm():
+    # Bound once so the Router tool schema is serialized identically on every call
+    return _get_llm().with_structured_output(Router)
 
 
 class State(TypedDict):
     """State for the graph."""
-    messages: List[BaseMessage]
+    # Workers run concurrently, so their message updates are merged by appending
+    messages: Annotated[List[BaseMessage], operator.add]
     next: str
 
 
-def supervisor_node(state: State) -> Command[Literal["pharmacist", "researcher", "medical_analyst", "__end__"]]:
-    messages = [
-        {"role": "system", "content": system_prompt},
-    ] + state["messages"]
+def _route_by_keywords(state: State) -> Optional[List[str]]:
+    """Return the single worker a request obviously needs, or None when unsure."""
+    if not state["messages"]:
+        return None
+    content = state["messages"][-1].content
+    if not isinstance(content, str):
+        return None
+    matched = [worker for worker, pattern in _WORKER_PATTERNS if pattern.search(content)]
+    return matched if len(matched) == 1 else None
+
 
-    # Ensure all names in messages conform to the pattern
-    for message in messages:
-        if 'name' in message:
-            message['name'] = re.sub(r'[^a-zA-Z0-9_-]', '_', message['name'])
+async def supervisor_node(state: State) -> List[Send]:
+    """Dispatch the request to the workers, which then run in parallel.
 
-    response = llm.with_structured_output(Router).invoke(messages)
-    goto = response["next"]
-    if goto == "FINISH":
-        goto = END
+    Every worker is dispatched unless SUPERVISOR_PREFILTER is set. With it set,
+    requests that clearly target one worker (see _route_by_keywords) go only to
+    that worker, and the supervisor LLM narrows down the rest.
+    """
+    workers = members
+    if SUPERVISOR_PREFILTER:
+        workers = _route_by_keywords(state)
+        if workers is None:
+            # Message names come from the fixed worker vocabulary set in the *_node
+            # functions, which already satisfies OpenAI's ^[a-zA-Z0-9_-]+$ rule
+            messages = [_SYSTEM_MSG, *state["messages"]]
+            response = await _get_router_llm().ainvoke(messages)
+            workers = [worker for worker in response["workers"] if worker in members] or members
+
+    return [Send(worker, state) for worker in workers]
 
-    return Command(goto=goto, update={"next": goto})
+
+def synthesizer_node(state: State) -> Dict[str, Any]:
+    """Fan-in point that runs once every dispatched worker has responded.
+
+    Each worker's response is already in ``messages`` and is rendered per agent
+    by process_query/stream_query, so no further LLM pass is made here.
+    """
+    return {"next": "FINISH"}
 
 
 # Define system prompts with chain-of-thought instructions for each agent
@@ -107,48 +191,21 @@ This reasoning should include:
 After your <think></think> section, provide your clear, concise final recommendation.
 """
 
-# Create the base pharmacist agent
-pharmacist_base_agent = create_react_agent(
-    llm, 
-    tools=[get_drug_use_cases, search_drugs_for_condition],
-    prompt=pharmacist_system_prompt
-)
-
-# Enhance with MCP tools (particularly useful for medication data)
-pharmacist_agent = enhance_agent_with_mcp(
-    pharamcist_base_agent,
-    include_tools=["get_medication_list", "search_fhir_resources"]
-)
 
-
-def pharmacist_node(state: State) -> Command[Literal["supervisor"]]:
-    # Make a copy of the state to avoid modifying the original
-    pharmacist_state = state.copy()
-    
-    # Add a directive to ensure chain-of-thought reasoning if not already present in the system message
-    cot_directive = HumanMessage(
-        content="Remember to include your detailed reasoning process within <think></think> tags before providing your final answer.",
-        name="directive"
-    )
-    
-    # Append the directive to messages
-    if "messages" in pharmacist_state:
-        pharmacist_state["messages"] = pharmacist_state["messages"] + [cot_directive]
-    
-    # Invoke the agent with the modified state
-    result = pharamcist_agent.invoke(pharmacist_state)
+async def pharmacist_node(state: State, config: RunnableConfig) -> Dict[str, Any]:
+    # The <think></think> instructions are part of the agent's system prompt,
+    # so the shared state is passed through as is
+    async with _agent_semaphore:
+        result = await _get_agent("pharmacist", config).ainvoke(state)
     
     # Extract the result and ensure it contains the thinking process
     content = result["messages"][-1].content
     
-    return Command(
-        update={
-            "messages": [
-                HumanMessage(content=content, name="pharmacist")
-            ]
-        },
-        goto="supervisor",
-    )
+    return {
+        "messages": [
+            HumanMessage(content=content, name="pharmacist")
+        ]
+    }
 
 researcher_system_prompt = """
 You are a medical researcher agent that helps find and analyze scientific literature and research papers.
@@ -163,19 +220,6 @@ This reasoning should include:
 After your <think></think> section, provide your clear, evidence-based conclusion with proper citations.
 """
 
-# Create the base researcher agent
-researcher_base_agent = create_react_agent(
-    llm, 
-    tools=[search_pubmed, fetch_pubmed_details, get_pubmed_identifiers, get_pmc_link, retrieve_article_text],
-    prompt=researcher_system_prompt
-)
-
-# Enhance with MCP tools relevant to research
-researcher_agent = enhance_agent_with_mcp(
-    researcher_base_agent,
-    include_tools=["list_fhir_resources", "search_fhir_resources"]
-)
-
 medical_analyst_system_prompt = """
 You are a medical analyst agent that helps analyze medical conditions, diagnoses, and treatment options.
 
@@ -189,189 +233,230 @@ This reasoning should include:
 After your <think></think> section, provide your clear clinical assessment and recommendations.
 """
 
-# Create the base medical analyst agent
-medical_analyst_base_agent = create_react_agent(
-    llm, 
-    tools=[search_wikem],
-    prompt=medical_analyst_system_prompt
-)
-
-# Enhance with all MCP tools for full data access
-medical_analyst_agent = enhance_agent_with_mcp(
-    medical_analyst_base_agent
-)
-
 
-def medical_analyst_node(state: State) -> Command[Literal["supervisor"]]:
-    # Make a copy of the state to avoid modifying the original
-    analyst_state = state.copy()
-    
-    # Add a directive to ensure chain-of-thought reasoning if not already present in the system message
-    cot_directive = HumanMessage(
-        content="Remember to include your detailed reasoning process within <think></think> tags before providing your final answer.",
-        name="directive"
-    )
-    
-    # Append the directive to messages
-    if "messages" in analyst_state:
-        analyst_state["messages"] = analyst_state["messages"] + [cot_directive]
-    
-    # Invoke the agent with the modified state
-    result = medical_analyst_agent.invoke(analyst_state)
+async def medical_analyst_node(state: State, config: RunnableConfig) -> Dict[str, Any]:
+    # The <think></think> instructions are part of the agent's system prompt,
+    # so the shared state is passed through as is
+    async with _agent_semaphore:
+        result = await _get_agent("medical_analyst", config).ainvoke(state)
     
     # Extract the result
     content = result["messages"][-1].content
     
-    return Command(
-        update={
-            "messages": [
-                HumanMessage(content=content, name="medical_analyst")
-            ]
-        },
-        goto="supervisor",
-    )
+    return {
+        "messages": [
+            HumanMessage(content=content, name="medical_analyst")
+        ]
+    }
+
+# Patterns used to tidy up links in researcher responses, compiled once at import
+_PMID_RE = re.compile(r'PMID:?\s*(\d+)')
+_DOUBLE_URL_RE = re.compile(r'\[https?://[^\]]+\]\(https?://[^)]+\)')
+_URL_OR_PMID_RE = re.compile(r'https?://|www\.|PMID')
+
+
+_RESEARCH_LINK_NOTE = "\n\n*Note: All URLs in this response are directly clickable.*"
+
+
+def _unwrap_double_url(match: re.Match) -> str:
+    """Keep only the target of a ``[url](url)`` markdown link."""
+    return match.group(0).split('](')[1][:-1]
+
+
+def _tidy_research_links(text: str) -> str:
+    """Apply the researcher's link fixes to (a whole-line piece of) its response."""
+    # Improve URL formatting for PubMed links - simplified to avoid nested links
+    # First, handle PubMed-specific references with cleaner formatting
+    if "PMID" in text:
+        text = _PMID_RE.sub(r'PMID: \1 (https://pubmed.ncbi.nlm.nih.gov/\1/)', text)
+
+    # Clean up any malformed double URL patterns that might exist
+    if "](" in text:
+        text = _DOUBLE_URL_RE.sub(_unwrap_double_url, text)
+
+    # Remove any "Read more here" text that might be causing confusion
+    return text.replace("Read more here", "")
+
 
-def researcher_node(state: State) -> Command[Literal["supervisor"]]:
+async def researcher_node(state: State, config: RunnableConfig) -> Dict[str, Any]:
     try:
-        # Make a copy of the state to avoid modifying the original
-        researcher_state = state.copy()
-        
-        # Add a directive to ensure chain-of-thought reasoning if not already present in the system message
-        cot_directive = HumanMessage(
-            content="Remember to include your detailed reasoning process within <think></think> tags before providing your final answer.",
-            name="directive"
-        )
-        
-        # Append the directive to messages
-        if "messages" in researcher_state:
-            researcher_state["messages"] = researcher_state["messages"] + [cot_directive]
-            
-        # Invoke the agent with the modified state
-        result = researcher_agent.invoke(researcher_state)
+        # The <think></think> instructions are part of the agent's system prompt,
+        # so the shared state is passed through as is
+        async with _agent_semaphore:
+            result = await _get_agent("researcher", config).ainvoke(state)
         
         # Get the content from the result
         content = result["messages"][-1].content
         
-        # Improve URL formatting for PubMed links - simplified to avoid nested links
-        if "http" in content or "www." in content or "PMID" in content:
-            # First, handle PubMed-specific references with cleaner formatting
-            content = re.sub(r'PMID:?\s*(\d+)', r'PMID: \1 (https://pubmed.ncbi.nlm.nih.gov/\1/)', content)
-            
-            # Clean up any malformed double URL patterns that might exist
-            content = re.sub(r'\[https?://[^\]]+\]\(https?://[^)]+\)', lambda m: m.group(0).split('](')[1][:-1], content)
-            
-            # Format any remaining raw URLs without creating nested structures
-            content = re.sub(r'(?<!\()(https?://[^\s\)<>]+)(?!\))', r'\1', content)
-            
-            # Remove any "Read more here" text that might be causing confusion
-            content = content.replace("Read more here", "")
-            
+        if _URL_OR_PMID_RE.search(content):
             # Add a note about clickable links
-            content += "\n\n*Note: All URLs in this response are directly clickable.*"
+            content = _tidy_research_links(content) + _RESEARCH_LINK_NOTE
         
-        return Command(
-            update={
-                "messages": [
-                    HumanMessage(content=content, name="researcher")
-                ]
-            },
-            goto="supervisor",
-        )
+        return {
+            "messages": [
+                HumanMessage(content=content, name="researcher")
+            ]
+        }
     except Exception as e:
         error_message = f"I encountered a technical issue while searching medical research databases: {str(e)}. Let me provide general information instead."
-        return Command(
-            update={
-                "messages": [
-                    HumanMessage(content=error_message, name="researcher")
-                ]
-            },
-            goto="supervisor",
-        )
-
-builder = StateGraph(State)
-builder.add_edge(START, "supervisor")
-builder.add_node("supervisor", supervisor_node)
-builder.add_node("pharmacist", pharmacist_node)
-builder.add_node("medical_analyst", medical_analyst_node)
-builder.add_node("researcher", researcher_node)
-graph = builder.compile()
+        return {
+            "messages": [
+                # Flagged so stream_query relays it even after partial output
+                HumanMessage(content=error_message, name="researcher", additional_kwargs={"error": str(e)})
+            ]
+        }
+
+# Tools, system prompt and MCP tool allowlist (None = all MCP tools) per worker
+_WORKER_SPECS = {
+    "pharmacist": (
+        [get_drug_use_cases, search_drugs_for_condition],
+        pharmacist_system_prompt,
+        ["get_medication_list", "search_fhir_resources"],
+    ),
+    "researcher": (
+        [search_pubmed, fetch_pubmed_details, get_pubmed_identifiers, get_pmc_link, retrieve_article_text],
+        researcher_system_prompt,
+        ["list_fhir_resources", "search_fhir_resources"],
+    ),
+    "medical_analyst": (
+        [search_wikem],
+        medical_analyst_system_prompt,
+        None,
+    ),
+}
+
+
+@functools.cache
+def _get_base_agents() -> Dict[str, Any]:
+    """Build the ReAct agent for each worker, without MCP tools."""
+    llm = _get_llm()
+    return {
+        name: create_react_agent(llm, tools=tools, prompt=prompt)
+        for name, (tools, prompt, _) in _WORKER_SPECS.items()
+    }
+
+
+@functools.cache
+def _get_mcp_agents() -> Dict[str, Any]:
+    """Enhance each worker's agent with the MCP tools relevant to it, once."""
+    base_agents = _get_base_agents()
+    return {
+        name: enhance_agent_with_mcp(base_agents[name], include_tools=mcp_tools)
+        for name, (_, _, mcp_tools) in _WORKER_SPECS.items()
+    }
+
+
+def get_agents(mcp_enabled: bool) -> Dict[str, Any]:
+    """Return the worker agents, with or without MCP tools; each set is built once."""
+    return _get_mcp_agents() if mcp_enabled else _get_base_agents()
+
+
+def _get_agent(name: str, config: RunnableConfig) -> Any:
+    """Return a worker's agent for this run.
+
+    The MCP setting travels with each graph run as ``configurable["mcp_enabled"]``
+    rather than as module state, so concurrent requests with different settings
+    don't swap agents under each other.
+    """
+    mcp_enabled = config.get("configurable", {}).get("mcp_enabled", MCP_ENABLED)
+    return get_agents(mcp_enabled)[name]
+
+
+def _run_config(mcp_enabled: Optional[bool]) -> Optional[RunnableConfig]:
+    """Graph run config carrying a request's MCP setting (None keeps the default)."""
+    if mcp_enabled is None:
+        return None
+    return {"configurable": {"mcp_enabled": mcp_enabled}}
+
+
+@functools.cache
+def _get_graph() -> CompiledStateGraph:
+    """Compile the supervisor/worker graph on first use."""
+    # START -> supervisor fan-out -> workers (in parallel) -> synthesizer -> END
+    builder = StateGraph(State)
+    builder.add_conditional_edges(START, supervisor_node, members)
+    builder.add_node("pharmacist", pharmacist_node)
+    builder.add_node("medical_analyst", medical_analyst_node)
+    builder.add_node("researcher", researcher_node)
+    builder.add_node("synthesizer", synthesizer_node)
+    for member in members:
+        builder.add_edge(member, "synthesizer")
+    builder.add_edge("synthesizer", END)
+    return builder.compile()
+
 
 def enable_disable_mcp(enabled: bool = True):
     """Enable or disable MCP integration for all agents.
     
+    This sets the default for requests that don't specify their own setting.
+
     Args:
         enabled: If True, MCP tools will be enabled. If False, they will be disabled.
         
     Returns:
         A message indicating the current state of MCP integration.
     """
-    global pharamcist_agent, researcher_agent, medical_analyst_agent
-    global pharamcist_base_agent, researcher_base_agent, medical_analyst_base_agent
-    
+    global MCP_ENABLED
+    # Build the agent set up front so the first request using it doesn't pay for it
+    get_agents(enabled)
+    MCP_ENABLED = enabled
     if enabled:
-        # Re-enable MCP for all agents
-        pharmacist_agent = enhance_agent_with_mcp(
-            pharamcist_base_agent,
-            include_tools=["get_medication_list", "search_fhir_resources"]
-        )
-        researcher_agent = enhance_agent_with_mcp(
-            researcher_base_agent,
-            include_tools=["list_fhir_resources", "search_fhir_resources"]
-        )
-        medical_analyst_agent = enhance_agent_with_mcp(
-            medical_analyst_base_agent
-        )
         return "MCP integration enabled for all agents."
     else:
-        # Disable MCP by reverting to base agents
-        pharamcist_agent = pharamcist_base_agent
-        researcher_agent = researcher_base_agent
-        medical_analyst_agent = medical_analyst_base_agent
         return "MCP integration disabled for all agents."
 
-def process_query(query: str):
-    """Process user query using the compiled graph and extract HumanMessage content."""
+
+def is_mcp_enabled() -> bool:
+    """Return whether requests get MCP tools by default."""
+    return MCP_ENABLED
+
+async def process_query(query: str, mcp_enabled: Optional[bool] = None):
+    """Process user query using the compiled graph and extract HumanMessage content.
+
+    ``mcp_enabled`` chooses MCP tools for this query only; None uses the default.
+    """
     results = []
     responses = []
-    agent_responses = {}  # Store responses by agent
+    # Message count and total characters per agent, for the debug summary
+    agent_stats: Dict[str, List[int]] = {}
     
     # Ensure proper message format for the LangChain graph
     # Using HumanMessage object instead of a tuple
     input_message = HumanMessage(content=query)
     
-    # Stream through the LangChain response
-    for s in graph.stream({"messages": [input_message]}, subgraphs=True):
-        # Extract only HumanMessage contents
-        for key, value in s[1].items():
-            if "messages" in value:
-                for message in value["messages"]:
-                    if isinstance(message, HumanMessage):
-                        agent_name = message.name if hasattr(message, 'name') else "agent"
-                        content = message.content
-                        
-                        # Store by agent for debugging
-                        if agent_name not in agent_responses:
-                            agent_responses[agent_name] = []
-                        agent_responses[agent_name].append(content)
-                        
-                        # Add agent name as a prefix if it exists
-                        if agent_name and agent_name not in ["user", "human"]:
-                            content = f"## {agent_name.capitalize()} Response:\n{content}"
-                        results.append(content)  # Collect HumanMessage content with agent name
-                        print(f"Added message from {agent_name}: {content[:100]}...")  # Debug content being added
+    graph = _get_graph()
+
+    # Only top-level node updates are streamed: each worker's update holds just
+    # its own named response, so the agents' inner steps never have to be
+    # filtered out of the stream
+    async for update in graph.astream({"messages": [input_message]}, _run_config(mcp_enabled), stream_mode="updates"):
+        for key, value in update.items():
+            if not value:
+                continue
+            for message in value.get("messages", ()):
+                agent_name = message.name or "agent"
+                content = message.content
+                
+                stats = agent_stats.setdefault(agent_name, [0, 0])
+                stats[0] += 1
+                stats[1] += len(content)
+                
+                # Add agent name as a prefix
+                content = f"## {agent_name.capitalize()} Response:\n{content}"
+                results.append(content)  # Collect the worker response with agent name
+                logger.debug("Added message from %s: %.100s...", agent_name, content)
             if "responses" in value:
                 responses.extend(value["responses"])  # Collect responses
                 
-        # Print some debug info to help troubleshoot
-        print(f"Stream result: {s}")
-
-    # Print agent summary
-    print("\n----- AGENT RESPONSE SUMMARY -----")
-    for agent, msgs in agent_responses.items():
-        print(f"Agent: {agent} - {len(msgs)} messages")
-        for i, msg in enumerate(msgs):
-            print(f"  Message {i+1}: {len(msg)} chars")
-    print("----- END SUMMARY -----\n")
+        # Log the raw stream step to help troubleshoot
+        logger.debug("Stream result: %s", update)
+
+    # Log agent summary
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("----- AGENT RESPONSE SUMMARY -----")
+        for agent, (count, chars) in agent_stats.items():
+            logger.debug("Agent: %s - %d messages, %d chars", agent, count, chars)
+        logger.debug("----- END SUMMARY -----")
     
     # Check if we have any results, return a default message if not
     if not results:
@@ -380,64 +465,145 @@ def process_query(query: str):
             return responses
         return ["I couldn't process your query. Please try again with a different question."]
     
-    # Print final results for debugging
-    print(f"Final results count: {len(results)}")
-    for i, result in enumerate(results):
-        print(f"Result {i+1} length: {len(result)} chars")
-        print(f"Result {i+1} preview: {result[:100]}...")
-    
+    logger.debug("Final results count: %d", len(results))
     return results   # Return all collected results instead of just the first one
 
+def _dumps_chunk(payload: Dict[str, Any]) -> str:
+    """Serialize a stream chunk for the SSE endpoint."""
+    # Chunks are capped near STREAM_FLUSH_CHARS, so this is always cheap enough
+    # to do inline; str rather than bytes since sse_starlette formats data as text
+    return orjson.dumps(payload).decode()
+
+# Tokens are coalesced per agent and flushed every STREAM_FLUSH_INTERVAL seconds
+# (or once STREAM_FLUSH_CHARS are pending), so clients get a few larger SSE
+# frames instead of one frame and one serialization per token
+STREAM_FLUSH_INTERVAL = 0.05
+STREAM_FLUSH_CHARS = 4096
+
+def _drain_pending(pending: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    """Turn the buffered tokens into one chunk payload per agent and reset the buffer."""
+    payloads = [{"chunk": "".join(parts), "agent": agent} for agent, parts in pending.items()]
+    pending.clear()
+    return payloads
+
+def _worker_for_event(event: Dict[str, Any]) -> Optional[str]:
+    """Return the top-level worker an event came from, or None if it is not a worker."""
+    # langgraph_node is the innermost node (the ReAct "agent"), so take the
+    # outermost segment of the checkpoint namespace instead, e.g.
+    # "pharmacist:<id>|agent:<id>" -> "pharmacist"
+    checkpoint_ns = event.get("metadata", {}).get("langgraph_checkpoint_ns", "")
+    worker = checkpoint_ns.split(":", 1)[0]
+    return worker if worker in members else None
+
+
 # New streaming function
-async def stream_query(query: str) -> AsyncGenerator[str, None]:
+async def stream_query(query: str, mcp_enabled: Optional[bool] = None) -> AsyncGenerator[Union[str, Dict[str, Any]], None]:
     """
-    Stream user query responses as they become available.
-    
-    This is a generator function that yields chunks of the response
-    as they become available from different agents.
+    Stream user query responses as tokens arrive.
+
+    Workers run in parallel, so chunks from different agents interleave; every
+    chunk carries its agent name and the first one from each agent is prefixed
+    with a "## Agent Response:" header. Tokens are batched for at most
+    STREAM_FLUSH_INTERVAL seconds. Tool calls are surfaced as
+    {"tool_use": {...}} dicts so the client can show progress. ``mcp_enabled``
+    chooses MCP tools for this query only; None uses the default.
     """
-    print(f"Starting stream_query with query: {query}")
-    
-    results = []
-    agent_responses = {}  # Store responses by agent
-    
+    logger.debug("Starting stream_query with query: %s", query)
+
     # Ensure proper message format for the LangChain graph
     input_message = HumanMessage(content=query)
-    
-    # Keep track of agents that have already responded
-    responded_agents = set()
-    
-    # Stream through the LangChain response
-    for s in graph.stream({"messages": [input_message]}, subgraphs=True):
-        # Extract only HumanMessage contents
-        for key, value in s[1].items():
-            if "messages" in value:
-                for message in value["messages"]:
-                    if isinstance(message, HumanMessage):
-                        agent_name = message.name if hasattr(message, 'name') else "agent"
-                        content = message.content
-                        
-                        # Only yield new agent responses to avoid duplicates
-                        agent_key = f"{agent_name}:{len(agent_responses.get(agent_name, []))}"
-                        if agent_key not in responded_agents:
-                            responded_agents.add(agent_key)
-                            
-                            # Store by agent for debugging
-                            if agent_name not in agent_responses:
-                                agent_responses[agent_name] = []
-                            agent_responses[agent_name].append(content)
-                            
-                            # Add agent name as a prefix if it exists
-                            if agent_name and agent_name not in ["user", "human"]:
-                                response_chunk = f"## {agent_name.capitalize()} Response:\n{content}"
-                                chunk_data = json.dumps({"chunk": response_chunk, "agent": agent_name})
-                                print(f"Yielding chunk from {agent_name}")
-                                yield chunk_data
-                                
-                                # Small delay to allow frontend to process
-                                await asyncio.sleep(0.05)
-        
+
+    # Agents that have emitted at least one token
+    started_agents = set()
+
+    # Tokens not yet sent, by agent
+    pending: Dict[str, List[str]] = {}
+    pending_chars = 0
+    loop = asyncio.get_running_loop()
+    last_flush = loop.time()
+
+    # Researcher text gets the same link fixes as researcher_node applies for
+    # process_query. They work line by line, so its tokens are held back until
+    # a newline (or the end of the model call)
+    research_line = ""
+    research_links = False
+
+    def queue_text(agent_name: str, content: str) -> None:
+        nonlocal pending_chars
+        if agent_name not in started_agents:
+            started_agents.add(agent_name)
+            logger.debug("First token from %s", agent_name)
+            content = f"## {agent_name.capitalize()} Response:\n{content}"
+        pending.setdefault(agent_name, []).append(content)
+        pending_chars += len(content)
+
+    def queue_research_text(text: str) -> None:
+        nonlocal research_links
+        research_links = research_links or bool(_URL_OR_PMID_RE.search(text))
+        queue_text("researcher", _tidy_research_links(text) if research_links else text)
+
+    graph = _get_graph()
+
+    async for event in graph.astream_events({"messages": [input_message]}, _run_config(mcp_enabled), version="v2"):
+        kind = event["event"]
+        tool_use = None
+        if kind == "on_chat_model_stream":
+            agent_name = _worker_for_event(event)
+            if agent_name is None:
+                continue
+            content = event["data"]["chunk"].content
+            # Tool-call chunks carry no text
+            if not content or not isinstance(content, str):
+                continue
+            if agent_name == "researcher":
+                research_line += content
+                if "\n" not in research_line:
+                    continue
+                lines, research_line = research_line.rsplit("\n", 1)
+                queue_research_text(lines + "\n")
+            else:
+                queue_text(agent_name, content)
+            if pending_chars < STREAM_FLUSH_CHARS and loop.time() - last_flush < STREAM_FLUSH_INTERVAL:
+                continue
+        elif kind == "on_tool_start":
+            agent_name = _worker_for_event(event)
+            if agent_name is None:
+                continue
+            tool_use = {"tool_use": {"name": event["name"], "agent": agent_name}}
+        elif kind == "on_chat_model_end":
+            # Flush when a model finishes so its tail isn't held back
+            if research_line and _worker_for_event(event) == "researcher":
+                queue_research_text(research_line)
+                research_line = ""
+            if not pending:
+                continue
+        elif kind == "on_chain_end" and event["name"] in members and _worker_for_event(event) == event["name"]:
+            # A worker node finished. Its response is relayed as a whole when
+            # nothing was streamed (e.g. it failed before answering) or when
+            # it is an error that came after partial output
+            agent_name = event["name"]
+            if agent_name == "researcher" and research_links:
+                queue_text(agent_name, _RESEARCH_LINK_NOTE)
+            messages = (event["data"].get("output") or {}).get("messages") or ()
+            message = messages[-1] if messages else None
+            if message is not None and (agent_name not in started_agents or message.additional_kwargs.get("error")):
+                queue_text(agent_name, message.content)
+            if not pending:
+                continue
+        else:
+            continue
+
+        for payload in _drain_pending(pending):
+            yield _dumps_chunk(payload)
+        pending_chars = 0
+        last_flush = loop.time()
+        if tool_use is not None:
+            yield tool_use
+
+    for payload in _drain_pending(pending):
+        yield _dumps_chunk(payload)
+
     # If no results, return a default message
-    if not agent_responses:
-        print("No agent responses, yielding default message")
-        yield json.dumps({"chunk": "I couldn't process your query. Please try again with a different question.", "agent": "system"})
\ No newline at end of file
+    if not started_agents:
+        logger.debug("No agent responses, yielding default message")
+        yield _dumps_chunk({"chunk": "I couldn't process your query. Please try again with a different question.", "agent": "system"})
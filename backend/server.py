@@ -3,22 +3,41 @@
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from sse_starlette.sse import EventSourceResponse
+from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import functools
 import json
 import logging
+import orjson
 import os
 import pathlib
-from typing import List, Dict, Any, Optional
+import traceback
+from typing import List, Dict, Any, Optional, AsyncIterator, Awaitable, Callable
 
-from novion import process_query, stream_query, enable_disable_mcp  # Import functions
+from novion import process_query, stream_query, enable_disable_mcp, get_agents, is_mcp_enabled  # Import functions
 from mcp.fhir_server import FHIRMCPServer
 from mcp.client import RadSysXMCPClient
 from chat_interface import initialize_chat_interface, get_chat_interface
 
-app = FastAPI(title="Medical Research Assistant API")
+# Configure logging (force=True: imported modules may already have called basicConfig)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), force=True)
+logger = logging.getLogger(__name__)
+
+# Worker threads for asyncio.to_thread offloads; the asyncio default is
+# min(32, cpu_count + 4), which concurrent FHIR/LLM I/O quickly exhausts
+THREAD_POOL_SIZE = int(os.getenv("THREAD_POOL_SIZE", (os.cpu_count() or 1) * 5))
+
+# Queries (/process and /stream) allowed to run the agent graph at once; the
+# rest wait their turn so light endpoints stay responsive under load
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+_llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+# Endpoints returning plain dicts/lists are encoded with orjson
+app = FastAPI(title="Medical Research Assistant API", default_response_class=ORJSONResponse)
 
 # Define the path to frontend files
 frontend_dir = pathlib.Path(__file__).parent.parent / "frontend"
@@ -62,10 +81,10 @@ class MCPServerInstallRequest(BaseModel):
 async def process(request: QueryRequest):
     """API endpoint to process user queries and return only human-readable content."""
     try:
-        result = await asyncio.to_thread(process_query, request.query)
+        async with _llm_semaphore:
+            result = await process_query(request.query)
         return {"result": result}
     except Exception as e:
-        import traceback
         print(f"Error processing query: {str(e)}")
         print(traceback.format_exc())
         return {"error": f"Error processing query: {str(e)}"}
@@ -76,10 +95,7 @@ async def process(request: QueryRequest):
 async def get_mcp_status():
     """Get the current status of MCP integration."""
     try:
-        # Call the function to get current MCP enabled status
-        # This assumes you've implemented a way to check if MCP is enabled
-        result = {"enabled": True}  # Replace with actual status check
-        return result
+        return {"enabled": is_mcp_enabled()}
     except Exception as e:
         return {"error": f"Error getting MCP status: {str(e)}"}
 
@@ -96,6 +112,48 @@ async def toggle_mcp(request: dict = {"enabled": True}):
         return {"error": f"Error toggling MCP: {str(e)}"}
 
 
+class _EndOfStream:
+    """Marks the end of a prefetched stream, carrying the producer's error if any."""
+
+    def __init__(self, error: Optional[Exception] = None):
+        self.error = error
+
+
+async def _prefetch(source: AsyncIterator[Any], maxsize: int = 64) -> AsyncIterator[Any]:
+    """Iterate ``source`` in a background task, buffering up to ``maxsize`` items.
+
+    The producer keeps generating while the consumer is busy writing to the
+    client; the bounded queue applies backpressure when the client is slow.
+    Errors raised by the producer are re-raised to the consumer.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    async def produce():
+        error = None
+        try:
+            async for item in source:
+                await queue.put(item)
+        except Exception as e:
+            error = e
+        finally:
+            if hasattr(source, "aclose"):
+                await source.aclose()
+        await queue.put(_EndOfStream(error))
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            item = await queue.get()
+            if isinstance(item, _EndOfStream):
+                if item.error is not None:
+                    raise item.error
+                break
+            yield item
+    finally:
+        # The client may disconnect mid-stream; stop generating for it
+        producer.cancel()
+
+
 # New streaming endpoint
 @app.post("/stream")
 @app.get("/stream")  # Add support for GET requests for EventSource
@@ -104,7 +162,7 @@ async def stream(request: Request):
     # Handle both GET and POST requests
     if request.method == "GET":
         # Extract query from URL parameters
-        query_params = dict(request.query_params)
+        query_params = request.query_params
         user_query = query_params.get("query", "")
         # Get MCP status from query params (default to True if not provided)
         mcp_enabled_str = query_params.get("mcp_enabled", "true").lower()
@@ -122,9 +180,10 @@ async def stream(request: Request):
     if not user_query:
         return {"error": "No query provided"}
     
-    # Set MCP integration status before processing the query
+    # The MCP setting applies to this query only; its agents are built (once)
+    # off the event loop before the graph needs them
     try:
-        await asyncio.to_thread(enable_disable_mcp, mcp_enabled)
+        await asyncio.to_thread(get_agents, mcp_enabled)
         print(f"MCP integration set to: {mcp_enabled} for query: {user_query[:50]}...")
     except Exception as e:
         print(f"Error setting MCP status: {str(e)}")
@@ -133,90 +192,119 @@ async def stream(request: Request):
         try:
             # Use a generator function from novion with MCP support
             last_tool_used = None
-            async for chunk in stream_query(user_query):
-                if not chunk:
-                    continue
+            async with _llm_semaphore:
+                async for chunk in _prefetch(stream_query(user_query, mcp_enabled)):
+                    if not chunk:
+                        continue
                     
-                # If this is a tool usage notification from the backend
-                if isinstance(chunk, dict) and "tool_use" in chunk:
-                    # Send tool usage information as a special event
-                    tool_info = chunk["tool_use"]
-                    tool_name = tool_info.get("name", "unknown_tool")
+                    # If this is a tool usage notification from the backend
+                    if isinstance(chunk, dict) and "tool_use" in chunk:
+                        # Send tool usage information as a special event
+                        tool_info = chunk["tool_use"]
+                        tool_name = tool_info.get("name", "unknown_tool")
                     
-                    if tool_name != last_tool_used:  # Only notify about new tools
-                        last_tool_used = tool_name
-                        tool_data = {"tool_use": {"tool_name": tool_name}}
-                        yield f"data: {json.dumps(tool_data)}\n\n"
-                else:
-                    # Regular text chunks
-                    response_data = {"chunk": chunk} if isinstance(chunk, str) else chunk
-                    yield f"data: {json.dumps(response_data)}\n\n"
+                        if tool_name != last_tool_used:  # Only notify about new tools
+                            last_tool_used = tool_name
+                            tool_data = {"tool_use": {"tool_name": tool_name}}
+                            yield {"data": orjson.dumps(tool_data).decode()}
+                    elif isinstance(chunk, str):
+                        # stream_query already serializes text chunks as
+                        # {"chunk": ..., "agent": ...}, so forward them verbatim
+                        yield {"data": chunk}
+                    else:
+                        yield {"data": orjson.dumps(chunk).decode()}
         except Exception as e:
             error_msg = str(e)
             tb = traceback.format_exc()
             print(f"Error in streaming: {error_msg}")
             print(tb)
             # Send the error to the client
-            yield f"data: {json.dumps({'error': f'Sorry, an error occurred while processing your query: {error_msg}. Please try again later.'})}\n\n"
-            yield "data: [DONE]\n\n"
+            yield {"data": orjson.dumps({'error': f'Sorry, an error occurred while processing your query: {error_msg}. Please try again later.'}).decode()}
+            yield {"data": "[DONE]"}
     
-    # Return a streaming response
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-        }
-    )
+    # Return a streaming response; EventSourceResponse handles the SSE framing,
+    # no-cache/no-buffering headers and keep-alive pings for idle proxies
+    return EventSourceResponse(event_generator(), ping=15)
+
+@functools.cache
+def get_fhir_server() -> FHIRMCPServer:
+    """Get the FHIR server instance used for tool requests, creating it on first use."""
+    return FHIRMCPServer()
+
+async def _fhir_list_resources(params: Dict[str, Any]) -> Any:
+    return await get_fhir_server().list_resources(params.get("uri_pattern", "*"), params.get("mime_type"))
+
 
-# Create FHIR server instance for handling tool requests
-fhir_server = FHIRMCPServer()
+async def _fhir_patient_read(tool_name: str, params: Dict[str, Any]) -> Any:
+    # Not cached: these are patient records (PHI) and the endpoint has no
+    # authenticated user to scope a cache entry to
+    patient_id = params.get("patient_id", "example")
+    return await get_fhir_server().call_tool(tool_name, {"patient_id": patient_id})
+
+
+async def _fhir_search_resources(params: Dict[str, Any]) -> Any:
+    return await get_fhir_server().call_tool("search_fhir_resources", {
+        "resource_type": params.get("resource_type", "Patient"),
+        "params": params.get("params", {}),
+    })
+
+
+# FHIR tool name -> handler taking the request params
+_FHIR_DISPATCH: Dict[str, Callable[[Dict[str, Any]], Awaitable[Any]]] = {
+    "list_fhir_resources": _fhir_list_resources,
+    "get_patient_demographics": functools.partial(_fhir_patient_read, "get_patient_demographics"),
+    "get_medication_list": functools.partial(_fhir_patient_read, "get_medication_list"),
+    "search_fhir_resources": _fhir_search_resources,
+}
+
+# Tools answered with a placeholder until their MCP servers are wired up
+_MOCK_TOOLS = frozenset({"search_web", "search_medical_literature"})
 
 # Initialize FHIR server on startup
 @app.on_event("startup")
 async def startup_event():
     """Initialize services on startup."""
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=THREAD_POOL_SIZE, thread_name_prefix="novion")
+    )
+    
+    # The landing page is static, so read it once instead of on every request
+    index_html_path = frontend_dir / "index.html"
+    app.state.index_html = index_html_path.read_bytes() if index_html_path.is_file() else None
+    
     try:
         # Initialize the FHIR server
-        await asyncio.to_thread(fhir_server.initialize)
+        await get_fhir_server().initialize()
         print("✅ FHIR server initialized and MCP integration enabled")
         
         # Initialize chat interface
         initialize_chat_interface()
         print("✅ Chat interface initialized")
+        
+        app.state.tools_payload = _build_tools_payload()
     except Exception as e:
         print(f"Error initializing services: {e}")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release pooled connections on shutdown."""
+    await get_fhir_server().close()
+
+
 # FHIR tool endpoint
 @app.post("/fhir/tool")
 async def fhir_tool(request: FHIRToolRequest):
     """API endpoint to call FHIR tools via MCP."""
     try:
-        # Process the tool request
-        tool_name = request.tool
-        params = request.params
-        
-        # Map the tool name to the corresponding function
-        if tool_name == "list_fhir_resources":
-            result = await fhir_server.list_resources()
-        elif tool_name == "get_patient_demographics":
-            patient_id = params.get("patient_id", "example")
-            result = await fhir_server.get_patient_demographics(patient_id)
-        elif tool_name == "get_medication_list":
-            patient_id = params.get("patient_id", "example")
-            result = await fhir_server.get_medication_list(patient_id)
-        elif tool_name == "search_fhir_resources":
-            resource_type = params.get("resource_type", "Patient")
-            search_params = params.get("params", {})
-            result = await fhir_server.search_resources(resource_type, search_params)
-        else:
-            return {"error": f"Unknown FHIR tool: {tool_name}"}
+        # Map the tool name to the corresponding handler
+        handler = _FHIR_DISPATCH.get(request.tool)
+        if handler is None:
+            return {"error": f"Unknown FHIR tool: {request.tool}"}
         
+        result = await handler(request.params)
         return {"result": result}
     except Exception as e:
-        import traceback
         print(f"Error executing FHIR tool: {str(e)}")
         print(traceback.format_exc())
         return {"error": f"Error executing FHIR tool: {str(e)}"}
@@ -235,7 +323,6 @@ async def chat(request: ChatRequest):
         )
         return {"response": response}
     except Exception as e:
-        import traceback
         print(f"Error in chat: {str(e)}")
         print(traceback.format_exc())
         return {"error": f"Error in chat: {str(e)}"}
@@ -255,19 +342,16 @@ async def chat_stream(request: ChatRequest):
                 model_name=request.model_name
             ):
                 if chunk:
-                    yield f"data: {json.dumps({'chunk': chunk})}\n\n"
+                    yield {"data": orjson.dumps({'chunk': chunk}).decode()}
             
             # Signal that the stream is complete
-            yield "data: [DONE]\n\n"
+            yield {"data": "[DONE]"}
         except Exception as e:
             print(f"Error in streaming chat: {str(e)}")
-            yield f"data: {json.dumps({'error': f'Error in streaming chat: {str(e)}'})}\n\n"
-            yield "data: [DONE]\n\n"
+            yield {"data": orjson.dumps({'error': f'Error in streaming chat: {str(e)}'}).decode()}
+            yield {"data": "[DONE]"}
     
-    return StreamingResponse(
-        stream_generator(),
-        media_type="text/event-stream"
-    )
+    return EventSourceResponse(stream_generator(), ping=15)
 
 
 # MCP Tool execution endpoint
@@ -279,14 +363,14 @@ async def execute_tool(request: ToolRequest):
         params = request.params
         
         # Support FHIR tools
-        if tool_name in ["list_fhir_resources", "get_patient_demographics", "get_medication_list", "search_fhir_resources"]:
+        if tool_name in _FHIR_DISPATCH:
             # Reuse the FHIR tool endpoint
             fhir_request = FHIRToolRequest(tool=tool_name, params=params)
             result = await fhir_tool(fhir_request)
             return result
         
         # Support for other MCP tools
-        elif tool_name in ["search_web", "search_medical_literature"]:
+        elif tool_name in _MOCK_TOOLS:
             # Mock implementation for now
             result = f"Executed {tool_name} with parameters: {json.dumps(params)}"
             # In a real implementation, this would call the appropriate MCP server
@@ -299,60 +383,77 @@ async def execute_tool(request: ToolRequest):
         else:
             return f"Unknown tool: {tool_name}. Available tools can be found via the /tools endpoint."
     except Exception as e:
-        import traceback
         print(f"Error executing tool {request.tool_name}: {str(e)}")
         print(traceback.format_exc())
         return f"Error executing tool: {str(e)}"
 
 
+# FHIR-specific tools with rich metadata
+FHIR_TOOLS = [
+    {
+        "name": "list_fhir_resources",
+        "description": "Lists all available FHIR resources that can be accessed",
+        "type": "function",
+        "category": "fhir"
+    },
+    {
+        "name": "get_patient_demographics",
+        "description": "Get demographics for a patient. Input should be a patient ID (e.g., 'example' for test data).",
+        "type": "function",
+        "category": "fhir"
+    },
+    {
+        "name": "get_medication_list",
+        "description": "Get medication list for a patient. Input should be a patient ID (e.g., 'example' for test data).",
+        "type": "function",
+        "category": "fhir"
+    },
+    {
+        "name": "search_fhir_resources",
+        "description": "Search FHIR resources. Requires resource_type (e.g., 'Patient', 'Medication') and params object.",
+        "type": "function",
+        "category": "fhir"
+    }
+]
+
+
+def _build_tools_payload() -> bytes:
+    """Serialize the FHIR tools plus the chat interface's tools for /tools."""
+    # Get the regular tools from the chat interface
+    regular_tools = get_chat_interface().get_available_tools()
+    
+    # Combine all tools
+    all_tools = FHIR_TOOLS + regular_tools if regular_tools else FHIR_TOOLS
+    return orjson.dumps(all_tools)
+
+
 # List available tools
 @app.get("/tools")
 async def list_tools():
     """API endpoint to list all available MCP tools."""
     try:
-        # Define FHIR-specific tools with rich metadata
-        fhir_tools = [
-            {
-                "name": "list_fhir_resources",
-                "description": "Lists all available FHIR resources that can be accessed",
-                "type": "function",
-                "category": "fhir"
-            },
-            {
-                "name": "get_patient_demographics",
-                "description": "Get demographics for a patient. Input should be a patient ID (e.g., 'example' for test data).",
-                "type": "function",
-                "category": "fhir"
-            },
-            {
-                "name": "get_medication_list",
-                "description": "Get medication list for a patient. Input should be a patient ID (e.g., 'example' for test data).",
-                "type": "function",
-                "category": "fhir"
-            },
-            {
-                "name": "search_fhir_resources",
-                "description": "Search FHIR resources. Requires resource_type (e.g., 'Patient', 'Medication') and params object.",
-                "type": "function",
-                "category": "fhir"
-            }
-        ]
-        
-        # Get the regular tools from the chat interface
-        interface = get_chat_interface()
-        regular_tools = interface.get_available_tools()
-        
-        # Combine all tools
-        all_tools = fhir_tools + regular_tools if regular_tools else fhir_tools
-        
-        return all_tools
+        # The tool list is static, so it is serialized once and reused until
+        # /tools/refresh is called
+        payload = getattr(app.state, "tools_payload", None)
+        if payload is None:
+            payload = app.state.tools_payload = _build_tools_payload()
+        return Response(content=payload, media_type="application/json")
     except Exception as e:
-        import traceback
         print(f"Error listing tools: {str(e)}")
         print(traceback.format_exc())
         return {"error": f"Error listing tools: {str(e)}"}
 
 
+@app.post("/tools/refresh")
+async def refresh_tools():
+    """API endpoint to rebuild the cached /tools list."""
+    try:
+        app.state.tools_payload = _build_tools_payload()
+        return {"status": "Tool list refreshed"}
+    except Exception as e:
+        return {"error": f"Error refreshing tools: {str(e)}"}
+
+
 # MCP Server installation endpoint
 @app.post("/mcp/install")
 async def install_mcp_server(request: MCPServerInstallRequest):
@@ -373,14 +474,24 @@ async def install_mcp_server(request: MCPServerInstallRequest):
 @app.get("/")
 async def serve_chat_ui():
     """Serve the chat UI landing page."""
-    index_html_path = frontend_dir / "index.html"
-    try:
-        with open(index_html_path, "r") as f:
-            html_content = f.read()
-            return HTMLResponse(content=html_content)
-    except FileNotFoundError:
+    index_html = getattr(app.state, "index_html", None)
+    if index_html is None:
         return HTMLResponse(content="<h1>Frontend not found</h1><p>Make sure the frontend build is in the correct location.</p>")
+    return HTMLResponse(content=index_html)
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # uvloop and httptools (see requirements.txt) replace the default asyncio
+    # loop and h11 parser; uvicorn falls back to those when they are missing
+    # One worker by default: the MCP toggle, the LLM/NCBI limiters and the
+    # response caches all live in process, so with several workers each gets
+    # its own copy and the toggle and rate caps no longer apply app-wide.
+    # Set WEB_CONCURRENCY to opt into more workers when that is acceptable
+    uvicorn.run(
+        "server:app",
+        host="0.0.0.0",
+        port=8000,
+        workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+        loop="auto",
+        http="auto",
+    )
@@ -0,0 +1,40 @@
+import json
+import os
+from pathlib import Path
+
+# Import installer from the MCP package
+try:
+    from backend.mcp.installer import MCPInstaller  # type: ignore
+except Exception:
+    from mcp.installer import MCPInstaller  # type: ignore
+
+
+def _make_installer(config_path: Path) -> MCPInstaller:
+    # Skip __init__ so the test doesn't shell out to node/npx or touch ~/.config
+    installer = MCPInstaller.__new__(MCPInstaller)
+    installer.config_path = config_path
+    return installer
+
+
+def test_save_config_round_trip(tmp_path: Path) -> None:
+    installer = _make_installer(tmp_path / "mcp_config.json")
+    config = {"mcpServers": {"fhir": {"command": "npx", "args": ["fhir"]}}}
+    installer._save_config(config)
+    assert installer._load_config() == config
+
+
+def test_save_config_leaves_no_temp_files(tmp_path: Path) -> None:
+    installer = _make_installer(tmp_path / "mcp_config.json")
+    installer._save_config({"mcpServers": {}})
+    installer._save_config({"mcpServers": {"a": {}}})
+    leftovers = [p for p in os.listdir(tmp_path) if p.endswith(".tmp")]
+    assert leftovers == []
+
+
+def test_save_config_failure_keeps_previous_file(tmp_path: Path) -> None:
+    config_path = tmp_path / "mcp_config.json"
+    installer = _make_installer(config_path)
+    installer._save_config({"mcpServers": {"keep": {}}})
+    # Sets are not JSON serializable, so this write fails part-way through
+    installer._save_config({"mcpServers": {"bad": {1, 2}}})
+    assert json.loads(config_path.read_text()) == {"mcpServers": {"keep": {}}}
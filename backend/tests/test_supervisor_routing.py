@@ -0,0 +1,31 @@
+import asyncio
+
+from langchain_core.messages import HumanMessage
+
+# Import the graph module (it imports tools.* relative to backend/)
+try:
+    import backend.novion as novion  # type: ignore
+except Exception:
+    import novion  # type: ignore
+
+
+def _dispatched(query: str) -> list:
+    sends = asyncio.run(novion.supervisor_node({"messages": [HumanMessage(content=query)], "next": ""}))
+    return [send.node for send in sends]
+
+
+def test_mixed_query_fans_out_to_all_workers(monkeypatch) -> None:
+    monkeypatch.setattr(novion, "SUPERVISOR_PREFILTER", False)
+    query = "What drug is first line for managing atrial fibrillation, and what do recent studies show?"
+    assert _dispatched(query) == novion.members
+
+
+def test_keyword_match_does_not_narrow_without_prefilter(monkeypatch) -> None:
+    monkeypatch.setattr(novion, "SUPERVISOR_PREFILTER", False)
+    # Matches only the pharmacist keywords, but still reaches every worker
+    assert _dispatched("What is the usual dose of metoprolol?") == novion.members
+
+
+def test_keyword_match_narrows_with_prefilter(monkeypatch) -> None:
+    monkeypatch.setattr(novion, "SUPERVISOR_PREFILTER", True)
+    assert _dispatched("What is the usual dose of metoprolol?") == ["pharmacist"]
@@ -1,46 +1,84 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import functools
+
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer
+from cachetools import TTLCache
 from langchain.tools import tool
 
+
+@functools.cache
+def _get_client() -> httpx.AsyncClient:
+    # One pooled client so repeated searches reuse the keep-alive connection
+    # to wikem.org instead of a new TCP+TLS handshake per call
+    return httpx.AsyncClient(
+        timeout=10.0,
+        follow_redirects=True,  # exact matches redirect to the article page
+        limits=httpx.Limits(max_keepalive_connections=32),
+    )
+
+
+# Parsed results per normalized query; WikEM articles change rarely, so a
+# repeat search skips both the round trip and the HTML parse
+_result_cache = TTLCache(maxsize=512, ttl=24 * 60 * 60)
+
+# Only the tags the extraction below looks at (plus the divs holding the
+# "Contents" marker) are parsed; scripts, styles and the rest are skipped
+_PAGE_STRAINER = SoupStrainer(['h1', 'h2', 'h3', 'ul', 'p', 'div'])
+
+
+def _parse_wikem_page(content: bytes) -> str:
+    """Extract the headings, lists and paragraphs that follow the page's table of contents."""
+    soup = BeautifulSoup(content, 'lxml', parse_only=_PAGE_STRAINER)
+    marker_text = "Contents"
+    marker = soup.find(string=marker_text)
+    
+    start_point = marker.find_parent('div') if marker else None
+
+    if not start_point:
+        return "The specific marker was not found in the page content."
+
+    lines = []
+    for tag in start_point.find_all_next(['h1', 'h2', 'h3', 'ul', 'p']):
+        if tag.name in ['h1', 'h2', 'h3']:
+            lines.append(tag.get_text())
+        elif tag.name == 'ul':
+            list_items = tag.find_all('li', recursive=False)
+            for li in list_items:
+                lines.append(f"- {li.get_text()}")
+                sub_lists = li.find_all('ul')
+                for sub_list in sub_lists:
+                    sub_items = sub_list.find_all('li', recursive=False)
+                    for sub_item in sub_items:
+                        lines.append(f"  - {sub_item.get_text()}")
+        elif tag.name == 'p':
+            lines.append(tag.get_text())
+
+    return "\n".join(lines).strip()
+
+
 @tool("Search_wikem_for_condition")
-def search_wikem(query: str) -> str:
+async def search_wikem(query: str) -> str:
     """Search WikEM for a given condition to understand management options (this includes medications and treatments)."""
     base_url = 'https://wikem.org'
-    search_url = f'{base_url}/w/index.php?search={query}'
+    search_url = f'{base_url}/w/index.php'
 
     print("The following is the search query: ", query)
 
-    response = requests.get(search_url)
+    cache_key = query.lower().strip()
+    cached = _result_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    response = await _get_client().get(search_url, params={"search": query})
     if response.status_code == 200:
-        soup = BeautifulSoup(response.content, 'html.parser')
-        marker_text = "Contents"
-        marker = soup.find(string=marker_text)
-        
-        start_point = marker.find_parent('div') if marker else None
-
-        result = ""
-        if start_point:
-            for tag in start_point.find_all_next(['h1', 'h2', 'h3', 'ul', 'p']):
-                if tag.name in ['h1', 'h2', 'h3']:
-                    result += f"{tag.get_text()}\n"
-                elif tag.name == 'ul':
-                    list_items = tag.find_all('li', recursive=False)
-                    for li in list_items:
-                        result += f"- {li.get_text()}\n"
-                        sub_lists = li.find_all('ul')
-                        for sub_list in sub_lists:
-                            sub_items = sub_list.find_all('li', recursive=False)
-                            for sub_item in sub_items:
-                                result += f"  - {sub_item.get_text()}\n"
-                elif tag.name == 'p':
-                    result += f"{tag.get_text()}\n"
-        else:
-            result = "The specific marker was not found in the page content."
-
-        return result.strip()
+        # A full WikEM page takes a while to parse; keep it off the event loop
+        result = await asyncio.to_thread(_parse_wikem_page, response.content)
+        _result_cache[cache_key] = result
+        return result
     else:
         return "Failed to retrieve the webpage"
 
 
-#result = search_wikem("hypokalemia")
-#print(result)
+if __name__ == "__main__":
+    print(asyncio.run(search_wikem.ainvoke("hypokalemia")))
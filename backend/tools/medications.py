@@ -1,25 +1,76 @@
-import requests
+import asyncio
+import functools
+import os
+from typing import Any, Tuple
+
+import httpx
+import orjson
+from cachetools import TTLCache
 from langchain.tools import tool
 
+
+RXNAV_BASE_URL = 'https://rxnav.nlm.nih.gov/REST'
+OPENFDA_LABEL_URL = 'https://api.fda.gov/drug/label.json'
+
+
+@functools.cache
+def _get_client() -> httpx.AsyncClient:
+    # Shared by the tools below so lookups reuse keep-alive connections to
+    # RxNav/OpenFDA, and so the agent's tool calls don't block the event loop
+    return httpx.AsyncClient(
+        timeout=30.0,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=20),
+    )
+
+
+# The cache below is bounded by total body size rather than entry count, since
+# a condition search returns up to 10 full drug labels in one body; a single
+# body larger than the budget is simply not cached
+RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", 32 * 1024 * 1024))
+
+
+def _entry_size(entry: Tuple[Any, int]) -> int:
+    return entry[1]
+
+
+# Parsed JSON of successful responses per full URL, with the body size it was
+# parsed from; NDC, label and condition lookups change rarely, so repeats
+# (e.g. the same drug across conditions) skip the API
+_response_cache = TTLCache(maxsize=RESPONSE_CACHE_BYTES, ttl=12 * 60 * 60, getsizeof=_entry_size)
+
+
+async def _get_json(url, params=None) -> Tuple[int, Any]:
+    """GET JSON through the shared client, serving repeats from the response cache.
+
+    Returns the status code and the parsed body (None if it isn't JSON).
+    """
+    cache_key = str(httpx.URL(url, params=params))
+    cached = _response_cache.get(cache_key)
+    if cached is not None:
+        return 200, cached[0]
+    response = await _get_client().get(url, params=params)
+    try:
+        data = orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        return response.status_code, None
+    if response.status_code == 200 and len(response.content) <= RESPONSE_CACHE_BYTES:
+        _response_cache[cache_key] = (data, len(response.content))
+    return response.status_code, data
+
+
 @tool("Retrieve_drug_information_from_RxNorm_API")
-def get_rxnorm_info_by_ndc(ndc_code):
+async def get_rxnorm_info_by_ndc(ndc_code):
     """
     Description: Retrieve drug information from RxNorm API using NDC code.
     - Input: NDC code (str)
     - Output: Drug name (str)
     """
-    base_url = 'https://rxnav.nlm.nih.gov/REST'
-    ndc_to_rxcui_endpoint = f'/ndcstatus.json?ndc={ndc_code}'
-    
-    rxcui_response = requests.get(base_url + ndc_to_rxcui_endpoint)
-    if rxcui_response.status_code == 200:
-        rxcui_data = rxcui_response.json()
+    rxcui_status, rxcui_data = await _get_json(f'{RXNAV_BASE_URL}/ndcstatus.json', params={'ndc': ndc_code})
+    if rxcui_status == 200 and rxcui_data is not None:
         rxcui = rxcui_data.get('ndcStatus', {}).get('rxcui', '')
         if rxcui:
-            rxcui_info_endpoint = f'/rxcui/{rxcui}/properties.json'
-            info_response = requests.get(base_url + rxcui_info_endpoint)
-            if info_response.status_code == 200:
-                info_data = info_response.json()
+            info_status, info_data = await _get_json(f'{RXNAV_BASE_URL}/rxcui/{rxcui}/properties.json')
+            if info_status == 200 and info_data is not None:
                 return info_data.get('properties', {}).get('name', "Name not found")
             else:
                 return "Failed to retrieve drug info."
@@ -28,22 +79,22 @@ def get_rxnorm_info_by_ndc(ndc_code):
     else:
         return "Failed to retrieve RxCUI."
 
-#print(get_rxnorm_info_by_ndc("00597-0087-17"))
+#print(asyncio.run(get_rxnorm_info_by_ndc.ainvoke("00597-0087-17")))
     
 @tool("Retrieve_drug_use_cases_from_OpenFDA_API")
-def get_drug_use_cases(drug_name):
+async def get_drug_use_cases(drug_name):
     """
     Description: Retrieve drug use cases from OpenFDA API using drug name.
     - Input: Drug name (str)
     - Output: Drug name (str), Use cases (list)
     """
-    endpoint = "https://api.fda.gov/drug/label.json"
     params = {
         'search': f'active_ingredient:{drug_name}',
         'limit': 1
     }
-    response = requests.get(endpoint, params=params)
-    data = response.json()
+    # OpenFDA answers "no matches" with a JSON 404, so the body is read either way
+    _, data = await _get_json(OPENFDA_LABEL_URL, params=params)
+    data = data or {}
 
     result = {'drug_name': drug_name}
 
@@ -56,44 +107,48 @@ def get_drug_use_cases(drug_name):
     return result
 
 
-#use_cases = get_drug_use_cases("aspirin")
+#use_cases = asyncio.run(get_drug_use_cases.ainvoke("aspirin"))
 #print(use_cases)
 
 @tool("Search_drugs_for_a_given_condition_using_OpenFDA_API")
-def search_drugs_for_condition(condition: str) -> str:
+async def search_drugs_for_condition(condition: str) -> str:
     """
     Description: Search drugs for a given condition using OpenFDA API.
     - Input: Condition (str)
     - Output: Drugs indicated for the condition (str)
     """
-    api_endpoint = 'https://api.fda.gov/drug/label.json'
-    
-    search_query = f'search=indications_and_usage:"{condition}"'
-    
-    url = f'{api_endpoint}?{search_query}&limit=10' 
-    response = requests.get(url)
+    params = {
+        'search': f'indications_and_usage:"{condition}"',
+        'limit': 10
+    }
+    status_code, data = await _get_json(OPENFDA_LABEL_URL, params=params)
     
-    if response.status_code == 200:
-        data = response.json()
+    if status_code == 200 and data is not None:
         
         if 'results' in data and data['results']:
             print(f"Drugs indicated for {condition}:\n")
-            for result in data['results']:
-                drug_name = result.get('openfda', {}).get('substance_name', ['Unknown'])[0]
-                if drug_name != 'Unknown':
-                    drug_info = get_drug_use_cases(drug_name)
-                    print(f"- {drug_name}")
-                    print(f"  - Use cases: {drug_info['use_cases'][0]}\n")
+            drug_names = [
+                result.get('openfda', {}).get('substance_name', ['Unknown'])[0]
+                for result in data['results']
+            ]
+            drug_names = [name for name in drug_names if name != 'Unknown']
+            # Look up every drug's use cases at once instead of one round trip each
+            drug_infos = await asyncio.gather(
+                *(get_drug_use_cases.ainvoke(drug_name) for drug_name in drug_names)
+            )
+            for drug_name, drug_info in zip(drug_names, drug_infos):
+                print(f"- {drug_name}")
+                print(f"  - Use cases: {drug_info['use_cases'][0]}\n")
 
         else:
             print(f"No drugs found indicated for {condition}.")
     else:
-        print(f"Failed to retrieve data. Status code: {response.status_code}")
+        print(f"Failed to retrieve data. Status code: {status_code}")
 
 test_list = "Atelectasis", "Consolidation", "Infiltration", "Pneumothorax", "Edema", "Emphysema", "Fibrosis", "Effusion", "Pneumonia", "Pleural_thickening", "Cardiomegaly", "Nodule Mass Hernia"
 
 #for condition in test_list:
-#    search_drugs_for_condition(condition)
+#    asyncio.run(search_drugs_for_condition.ainvoke(condition))
 #    print("\n")
 
-#print(search_drugs_for_condition("Pneumothorax"))
\ No newline at end of file
+#print(asyncio.run(search_drugs_for_condition.ainvoke("Pneumothorax")))
\ No newline at end of file
@@ -1,145 +1,391 @@
-import requests
-from bs4 import BeautifulSoup
-from pprint import pprint
+import asyncio
+import functools
+import os
+import re
+from io import BytesIO
+
+import httpx
+import orjson
+from cachetools import LRUCache, TTLCache
+from lxml import etree
 from langchain.tools import tool
 
+
+_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
+
+
+@functools.cache
+def _get_client() -> httpx.AsyncClient:
+    # Shared by every tool below so the agent's parallel tool calls reuse
+    # pooled keep-alive connections to eutils/pubmed/pmc instead of paying
+    # a TCP+TLS handshake per request
+    return httpx.AsyncClient(
+        headers={"User-Agent": _USER_AGENT},
+        timeout=30.0,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+        transport=httpx.AsyncHTTPTransport(retries=3),  # connect errors only
+    )
+
+
+# Caps how many of the agent's concurrent tool calls can be in flight against
+# NCBI at once; this bounds concurrency, not the request rate
+_ncbi_semaphore = asyncio.Semaphore(8)
+_MAX_RETRIES = 3
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_RETRY_BACKOFF = 0.5
+
+EUTILS_BASE_URL = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
+# An API key raises NCBI's E-utilities limit from 3 to 10 requests/s
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+EUTILS_REQUESTS_PER_SECOND = 10 if NCBI_API_KEY else 3
+
+
+class _RateLimiter:
+    """Space out requests so no more than ``rate`` start in any one second."""
+
+    def __init__(self, rate: float):
+        self._interval = 1 / rate
+        self._next_slot = 0.0
+
+    async def wait(self) -> None:
+        # Each caller reserves the next free slot before sleeping, so
+        # concurrent callers queue up one interval apart
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + self._interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+# Every E-utilities attempt (including _fetch's retries) takes a slot; cache
+# hits and 304 revalidations served from memory don't reach it
+_eutils_rate_limiter = _RateLimiter(EUTILS_REQUESTS_PER_SECOND)
+# NCBI asks for POST above ~200 ids so long id lists don't hit URL length limits
+EUTILS_POST_THRESHOLD = 200
+
+# Both response caches below are bounded by total body size rather than entry
+# count, since EFetch XML and article pages run from ~100 KB to over 1 MB;
+# a single body larger than the budget is simply not cached
+RESPONSE_CACHE_BYTES = int(os.getenv("RESPONSE_CACHE_BYTES", 32 * 1024 * 1024))
+
+
+def _response_size(response: httpx.Response) -> int:
+    return len(response.content)
+
+
+# Successful responses per full URL; PMID lists, summaries and article pages
+# rarely change, so repeat lookups skip NCBI entirely for a week
+_response_cache = TTLCache(maxsize=RESPONSE_CACHE_BYTES, ttl=7 * 24 * 60 * 60, getsizeof=_response_size)
+# Responses that carried an ETag or Last-Modified, kept past their TTL so an
+# expired entry is revalidated with a conditional GET (a bodiless 304 when
+# unchanged) instead of downloaded and parsed again
+_validated_responses = LRUCache(maxsize=RESPONSE_CACHE_BYTES, getsizeof=_response_size)
+
+
+async def _get(url, **kwargs) -> httpx.Response:
+    """GET through the shared client, serving repeats from the response cache."""
+    cache_key = str(httpx.URL(url, params=kwargs.get("params")))
+    cached = _response_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    previous = _validated_responses.get(cache_key)
+    if previous is not None:
+        if "ETag" in previous.headers:
+            headers["If-None-Match"] = previous.headers["ETag"]
+        if "Last-Modified" in previous.headers:
+            headers["If-Modified-Since"] = previous.headers["Last-Modified"]
+
+    response = await _fetch("GET", url, headers=headers, **kwargs)
+    if response.status_code == 304 and previous is not None:
+        response = previous
+    if response.status_code == 200 and _response_size(response) <= RESPONSE_CACHE_BYTES:
+        _response_cache[cache_key] = response
+        if "ETag" in response.headers or "Last-Modified" in response.headers:
+            _validated_responses[cache_key] = response
+    return response
+
+
+async def _fetch(method, url, **kwargs) -> httpx.Response:
+    """Send a request through the shared client, retrying rate limits and transient 5xx with backoff."""
+    for attempt in range(_MAX_RETRIES + 1):
+        if url.startswith(EUTILS_BASE_URL):
+            await _eutils_rate_limiter.wait()
+        async with _ncbi_semaphore:
+            response = await _get_client().request(method, url, **kwargs)
+        if response.status_code not in _RETRY_STATUSES or attempt == _MAX_RETRIES:
+            return response
+        retry_after = response.headers.get("Retry-After", "")
+        await asyncio.sleep(float(retry_after) if retry_after.isdigit() else _RETRY_BACKOFF * 2 ** attempt)
+    return response
+
+
+async def _eutils(endpoint, params) -> httpx.Response:
+    """Call an E-utilities endpoint, switching to POST for long id lists."""
+    url = f"{EUTILS_BASE_URL}/{endpoint}.fcgi"
+    if NCBI_API_KEY:
+        params = {**params, "api_key": NCBI_API_KEY}
+    if params.get("id", "").count(",") >= EUTILS_POST_THRESHOLD:
+        return await _fetch("POST", url, data=params)
+    return await _get(url, params=params)
+
+
 @tool("Search_PubMed_and_return_PMIDs")
-def search_pubmed(query, retmax=20):
+async def search_pubmed(query, retmax=20):
     """
     Description: Search PubMed for the given query and return a list of PMIDs.
     -Input: Query (str)
     -Output: PMIDs (list)
     """
     try:
-        esearch_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi"
         params = {
             "db": "pubmed",
             "term": query,
             "retmax": retmax,
             "retmode": "json"
         }
-        response = requests.get(esearch_url, params=params)
+        response = await _eutils("esearch", params)
         response.raise_for_status()  # Raise an error for bad responses
-        data = response.json()
+        data = orjson.loads(response.content)
         return data["esearchresult"]["idlist"]
     except Exception as e:
         print(f"Error in search_pubmed: {str(e)}")
         return []
 
+# EFetch bodies larger than this are parsed on the loop's default executor, so
+# a batch of hundreds of articles doesn't stall the event loop while it parses
+LARGE_PARSE_THRESHOLD = 1024 * 1024
+
+
+def _parse_abstracts(content: bytes) -> dict:
+    """Map each PMID in an EFetch PubmedArticleSet to its abstract, streaming over the XML."""
+    abstracts = {}
+    for _, article in etree.iterparse(BytesIO(content), events=('end',), tag='PubmedArticle'):
+        pmid = article.findtext('MedlineCitation/PMID')
+        sections = [''.join(text.itertext()).strip() for text in article.iterfind('.//Abstract/AbstractText')]
+        if pmid and any(sections):
+            abstracts[pmid] = ' '.join(section for section in sections if section)
+        # Drop each finished article (and any preceding siblings) so memory
+        # stays flat however many PMIDs were fetched
+        article.clear()
+        while article.getprevious() is not None:
+            del article.getparent()[0]
+    return abstracts
+
+
+# Explicitly tagged ids only ("PMID:36462630, PMID: 35000000"); an untagged
+# number like "2020" or "1918 1957" is a search term, not a PMID
+_PMID_LIST_RE = re.compile(r"PMID:?\s*\d+(?:[\s,]+PMID:?\s*\d+)*", re.IGNORECASE)
+
+
 @tool("Retrieve_details_for_PMIDs_with_ESummary")
-def fetch_pubmed_details(query, retmax=20):
+async def fetch_pubmed_details(query, retmax=20):
     """
     Description: Retrieve details for a list of PMIDs using the ESummary endpoint.
-    - Input: query (str or list) - Either a search query or a list of PMIDs
+    - Input: query (str or list) - A search query, a list of PMIDs, or PMIDs written as "PMID:36462630, PMID:35000000"
     - Output: Summary data for PubMed articles
     """
     # Handle different input formats
     # If query is a list, assume it's a list of PMIDs
     if isinstance(query, list):
         pmids = query
-    # If query is a string, assume it's a search query
+    # A string of tagged PMIDs ("PMID:36462630, PMID:35000000") needs no ESearch
+    # round trip; searching for it would AND the ids together and usually match nothing
+    elif isinstance(query, str) and _PMID_LIST_RE.fullmatch(query.strip()):
+        pmids = re.findall(r"\d+", query)
+    # Any other string is a search query
     elif isinstance(query, str):
-        # Use invoke instead of direct call
-        try:
-            pmids = search_pubmed.invoke({"query": query, "retmax": retmax})
-        except AttributeError:
-            # Fallback for backward compatibility
-            pmids = search_pubmed(query, retmax)
+        pmids = await search_pubmed.ainvoke({"query": query, "retmax": retmax})
     else:
         return {"result": {"uids": []}, "error": "Invalid query format. Expected string or list."}
     
     if not pmids:
         return {"result": {"uids": []}}
 
-    esummary_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esummary.fcgi"
-    params = {
-        "db": "pubmed",
-        "id": ",".join(pmids),
-        "retmode": "json"
-    }
-    
+    ids = ",".join(pmids)
+
     try:
-        response = requests.get(esummary_url, params=params)
-        response.raise_for_status()
-        summary_data = response.json()
+        # Summaries and abstracts come from separate endpoints; fetch both at once
+        summary_response, fetch_response = await asyncio.gather(
+            _eutils("esummary", {"db": "pubmed", "id": ids, "retmode": "json"}),
+            _eutils("efetch", {"db": "pubmed", "id": ids, "retmode": "xml"}),
+        )
+        summary_response.raise_for_status()
+        fetch_response.raise_for_status()
+        summary_data = orjson.loads(summary_response.content)
+
+        if len(fetch_response.content) > LARGE_PARSE_THRESHOLD:
+            abstracts = await asyncio.to_thread(_parse_abstracts, fetch_response.content)
+        else:
+            abstracts = _parse_abstracts(fetch_response.content)
 
-        # Add direct PubMed URLs to each article
         for pmid in pmids:
             if pmid in summary_data["result"]:
                 # Add direct PubMed URL
                 summary_data["result"][pmid]["pubmed_url"] = f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
-
-        efetch_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/efetch.fcgi"
-        params = {
-            "db": "pubmed",
-            "id": ",".join(pmids),
-            "retmode": "xml"
-        }
-        response = requests.get(efetch_url, params=params)
-        response.raise_for_status()
-        
-        # Use XML parser for proper XML parsing
-        fetch_data = BeautifulSoup(response.text, features="xml")
-
-        for pmid in pmids:
-            abstract = fetch_data.find('AbstractText', {'Label': pmid})
-            if abstract:
-                summary_data["result"][pmid]["abstract"] = abstract.get_text(strip=True)
-            else:
-                summary_data["result"][pmid]["abstract"] = "No abstract available"
+                summary_data["result"][pmid]["abstract"] = abstracts.get(pmid, "No abstract available")
 
         return summary_data
     except Exception as e:
         return {"error": f"Error fetching PubMed details: {str(e)}", "result": {"uids": []}}
 
+_EXCLUDE_TEXTS = ("Supplementary material", "Acknowledgments",
+                  "Associated Data", "Competing interests", "CRediT author statement")
+# One alternation scanned once per heading instead of a substring test per phrase
+_EXCLUDE_RE = re.compile("|".join(map(re.escape, _EXCLUDE_TEXTS)))
+# A heading containing none of the phrases' first letters can't contain a
+# phrase, so most headings ("Introduction", "Methods", "Results") skip the search
+_EXCLUDE_FIRST_CHARS = frozenset(text[0] for text in _EXCLUDE_TEXTS)
+
+
+# XPath string() is the element's text content, concatenated in C; the
+# pull/iter parsers yield plain etree elements without lxml.html's text_content()
+_text_content = etree.XPath("string()")
+
+
+def _heading_text(element) -> str:
+    # Headings are often split across inline spans ("<span>2.</span><span>Methods</span>"),
+    # so pieces are joined with a space and whitespace runs collapsed
+    return " ".join(" ".join(element.itertext()).split())
+
+
+# Headings after which a PMC page has no more article body
+_END_OF_ARTICLE_TEXTS = frozenset({"References", "Bibliography"})
+_STREAM_CHUNK_SIZE = 32 * 1024
+
+# Extracted sections per PMC URL. Streamed pages skip the response cache, and
+# the agent often revisits the same papers across overlapping questions
+_article_cache = TTLCache(maxsize=256, ttl=7 * 24 * 60 * 60)
+
+
+class _ArticleSections:
+    """Collects the paragraphs under each h2/h3 heading of a PMC article from parser events."""
+
+    def __init__(self):
+        self.sections = []
+        # Section currently collecting paragraphs, per parent element; a p only
+        # belongs to a heading that shares its parent, as with find_next_siblings
+        self.open_sections = {}
+
+    def feed(self, events) -> bool:
+        """Consume (event, element) pairs; returns True once the article body has ended."""
+        for _, element in events:
+            parent = element.getparent()
+            if element.tag == 'p':
+                section = self.open_sections.get(parent)
+                if section is not None:
+                    section['p_tags'].append(_text_content(element).strip())
+                element.clear()
+                continue
+
+            tag_text = _heading_text(element)
+            if tag_text in _END_OF_ARTICLE_TEXTS:
+                return True
+            if not _EXCLUDE_FIRST_CHARS.isdisjoint(tag_text) and _EXCLUDE_RE.search(tag_text):
+                self.open_sections[parent] = None
+                continue
+            section = {'tag': element.tag, 'text': tag_text, 'p_tags': []}
+            self.sections.append(section)
+            self.open_sections[parent] = section
+        return False
+
+    def result(self) -> list:
+        return [section for section in self.sections if section['p_tags']]
+
+
+async def _article_sections(url) -> list:
+    """Sections of a PMC article, served from the article cache when already extracted."""
+    sections = _article_cache.get(url)
+    if sections is None:
+        sections = await _stream_article_sections(url)
+        _article_cache[url] = sections
+    return sections
+
+
+async def _stream_article_sections(url) -> list:
+    """Parse a PMC page while it downloads, stopping once the reference list starts."""
+    for attempt in range(_MAX_RETRIES + 1):
+        async with _ncbi_semaphore:
+            async with _get_client().stream("GET", url) as response:
+                if response.status_code == 200:
+                    parser = etree.HTMLPullParser(events=('end',), tag=('h2', 'h3', 'p'),
+                                                  encoding=response.encoding)
+                    collector = _ArticleSections()
+                    async for chunk in response.aiter_bytes(_STREAM_CHUNK_SIZE):
+                        parser.feed(chunk)
+                        if collector.feed(parser.read_events()):
+                            break
+                    else:
+                        parser.close()
+                        collector.feed(parser.read_events())
+                    return collector.result()
+                retry_after = response.headers.get("Retry-After", "")
+        if response.status_code not in _RETRY_STATUSES or attempt == _MAX_RETRIES:
+            raise Exception(
+                f"Error retrieving the page: HTTP {response.status_code}")
+        await asyncio.sleep(float(retry_after) if retry_after.isdigit() else _RETRY_BACKOFF * 2 ** attempt)
+
+
+def _has_class(name: str) -> str:
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# One compiled string-valued XPath per identifier, evaluated against the
+# identifiers list alone. They mirror the original CSS selectors
+# ("ul#full-view-identifiers li span.identifier.pmc a.id-link", ...) and
+# yield "" when the identifier is absent
+_IDENTIFIER_XPATHS = {
+    'PMID': etree.XPath(
+        f"normalize-space(.//li//span[{_has_class('identifier')} and {_has_class('pubmed')}]"
+        f"//strong[{_has_class('current-id')}])"),
+    'PMCID': etree.XPath(
+        f"normalize-space(.//li//span[{_has_class('identifier')} and {_has_class('pmc')}]"
+        f"//a[{_has_class('id-link')}])"),
+    'DOI': etree.XPath(
+        f"string(.//li//span[{_has_class('identifier')} and {_has_class('doi')}]"
+        f"//a[{_has_class('id-link')}]/@href)"),
+}
+_PARSE_CHUNK_SIZE = 32 * 1024
+
+
+def _parse_identifiers(content: bytes, encoding: str = "utf-8") -> dict:
+    """Read PMID, PMCID and DOI from a PubMed article page.
+
+    The identifiers list sits in the page header, so parsing stops as soon as
+    it has been closed instead of building the whole page.
+    """
+    parser = etree.HTMLPullParser(events=('end',), tag='ul', encoding=encoding)
+    for offset in range(0, len(content), _PARSE_CHUNK_SIZE):
+        parser.feed(content[offset:offset + _PARSE_CHUNK_SIZE])
+        for _, element in parser.read_events():
+            if element.get('id') == 'full-view-identifiers':
+                return {name: xpath(element) or None for name, xpath in _IDENTIFIER_XPATHS.items()}
+    return dict.fromkeys(_IDENTIFIER_XPATHS)
+
+
 @tool("Return_pubmed_identifiers")
-def get_pubmed_identifiers(url):
+async def get_pubmed_identifiers(url):
     """
      Description: Returns pubmed identifier
     - Input: url (str)
     - Output: Identifiers (list)
     """
-    response = requests.get(url)
+    response = await _get(url)
     if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        identifiers = {}
-
-        # PMID
-        pmid_tag = soup.select_one(
-            "ul#full-view-identifiers li span.identifier.pubmed strong.current-id")
-        if (pmid_tag):
-            identifiers['PMID'] = pmid_tag.get_text(strip=True)
-        else:
-            identifiers['PMID'] = None
-
-        # PMCID
-        pmcid_tag = soup.select_one(
-            "ul#full-view-identifiers li span.identifier.pmc a.id-link")
-        if (pmcid_tag):
-            identifiers['PMCID'] = pmcid_tag.get_text(strip=True)
-        else:
-            identifiers['PMCID'] = None
-
-        # DOI
-        doi_tag = soup.select_one(
-            "ul#full-view-identifiers li span.identifier.doi a.id-link")
-        if (doi_tag):
-            identifiers['DOI'] = doi_tag.get("href")
-        else:
-            identifiers['DOI'] = None
-
-        return identifiers
+        return _parse_identifiers(response.content, response.encoding)
     else:
         raise Exception(
             f"Error retrieving the page: HTTP {response.status_code}")
 
 
 @tool("Return_pmc_link")
-def get_pmc_link(url):
+async def get_pmc_link(url):
     """
     Description: Returns the pmc link
     """
-    identifiers = get_pubmed_identifiers(url)
+    identifiers = await get_pubmed_identifiers.ainvoke(url)
     pmcid = identifiers.get('PMCID')
     if pmcid:
         pmc_url = f"https://pmc.ncbi.nlm.nih.gov/articles/{pmcid}/"
@@ -148,64 +394,41 @@ def get_pmc_link(url):
         return None
 
 @tool("Return_article_text")
-def retrieve_article_text(pmc_url):
+async def retrieve_article_text(pmc_url):
     """
     Description: retrieves article text
+    - Input: pmc_url (str or list) - A PMC article URL, or a list of them to retrieve in one call
+    - Output: Sections of the article, or a dict of sections per URL when given a list
     """
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'}
-    response = requests.get(pmc_url, headers=headers)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        h2_tags = soup.find_all(['h2', 'h3'])
-        h2_h3_p_texts = []
-        exclude_texts = ["Supplementary material", "Acknowledgments",
-                         "Associated Data", "Competing interests", "CRediT author statement"]
-        for tag in h2_tags:
-            tag_text = tag.get_text(strip=True)
-            if any(exclude_text in tag_text for exclude_text in exclude_texts):
-                continue
-            p_tags = []
-            for sibling in tag.find_next_siblings():
-                if sibling.name in ['h2', 'h3']:
-                    break
-                if sibling.name == 'p':
-                    p_tags.append(sibling.get_text(strip=True))
-            if p_tags:
-                h2_h3_p_texts.append(
-                    {'tag': tag.name, 'text': tag_text, 'p_tags': p_tags})
-        return h2_h3_p_texts
-    else:
-        raise Exception(
-            f"Error retrieving the page: HTTP {response.status_code}")
-
+    if isinstance(pmc_url, str):
+        return await _article_sections(pmc_url)
 
-#url = "https://pubmed.ncbi.nlm.nih.gov/36462630/"
-# pmc_link = get_pmc_link(url)
-# if pmc_link:
-#     h2_h3_p_texts = retrieve_article_text(pmc_link)
-#     pprint(h2_h3_p_texts)
-# else:
-#     print("PMCID not found")
+    # Several papers in one tool call cost the agent one LLM round trip
+    # instead of one per paper; the downloads run concurrently
+    results = await asyncio.gather(
+        *(_article_sections(url) for url in pmc_url), return_exceptions=True)
+    return {
+        url: {"error": str(result)} if isinstance(result, Exception) else result
+        for url, result in zip(pmc_url, results)
+    }
 
 
-# # Example query to search PubMed
-# query = "COVID-19"
+if __name__ == "__main__":
+    from pprint import pprint
 
-# # Search PubMed and fetch details
-# pubmed_details = fetch_pubmed_details(query)
-# pprint(pubmed_details)
+    async def main():
+        # Search PubMed and fetch details
+        pprint(await fetch_pubmed_details.ainvoke({"query": "COVID-19", "retmax": 5}))
 
-# # Example PubMed article URL
-# url = "https://pubmed.ncbi.nlm.nih.gov/36462630/"
+        # Get PMC link from PubMed URL
+        pmc_link = await get_pmc_link.ainvoke("https://pubmed.ncbi.nlm.nih.gov/36462630/")
+        print(f"PMC Link: {pmc_link}")
 
-# # Get PMC link from PubMed URL
-# pmc_link = get_pmc_link(url)
-# print(f"PMC Link: {pmc_link}")
+        # Retrieve article text from PMC link
+        if pmc_link:
+            pprint(await retrieve_article_text.ainvoke(pmc_link))
+        else:
+            print("PMCID not found")
 
-# # Retrieve article text from PMC link
-# if pmc_link:
-#     article_text = retrieve_article_text(pmc_link)
-#     pprint(article_text)
-# else:
-#     print("PMCID not found")
+    # One event loop for all three calls, since they share a pooled client
+    asyncio.run(main())
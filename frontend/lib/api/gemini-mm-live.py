@@ -2,15 +2,18 @@ import asyncio
 import json
 import pyaudio
 import threading
+import queue
 import os
 import base64
+import binascii
 import websockets
 import httpx
+import functools
 from websockets.client import WebSocketClientProtocol
 from websockets.server import serve
 from dotenv import load_dotenv
-import struct
 import wave
+from concurrent.futures import ThreadPoolExecutor
 import PIL
 import mss
 import requests 
@@ -19,6 +22,37 @@ from PIL import Image
 from io import BytesIO
 # from google.generativeai import WebSocketDisconnect
 
+try:
+    import h2  # noqa: F401  (needed by httpx for HTTP/2)
+    _HTTP2_AVAILABLE = True
+except ImportError:
+    _HTTP2_AVAILABLE = False
+
+# Audio frames are base64 encoded/decoded several times a second; pybase64's
+# SIMD codecs are several times faster than the stdlib's scalar loop. Without
+# it, a2b_base64 decodes the ASCII str directly, where b64decode would first
+# copy it into an intermediate bytes object
+try:
+    import pybase64
+    b64encode_audio = pybase64.b64encode
+    b64decode_audio = pybase64.b64decode
+except ImportError:
+    b64encode_audio = base64.b64encode
+    b64decode_audio = binascii.a2b_base64
+
+# orjson serializes/parses every audio frame and Gemini response several times
+# faster than the stdlib; fall back to json when it isn't installed
+try:
+    import orjson
+
+    def json_dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+    json_loads = orjson.loads  # accepts str or bytes; errors subclass json.JSONDecodeError
+except ImportError:
+    json_dumps = json.dumps
+    json_loads = json.loads
+
 # ------------------------------------------------------------------------------
 # ENV and constants
 # ------------------------------------------------------------------------------
@@ -44,9 +78,27 @@ INPUT_SAMPLE_RATE = 16000  # Input: 16kHz little-endian PCM
 OUTPUT_SAMPLE_RATE = 24000 # Output: 24kHz little-endian PCM
 BYTES_PER_SAMPLE = 2      # 16-bit = 2 bytes per sample
 BUFFER_SIZE = 8192        # Larger buffer for stability
+# Mic reads batched into one message to halve per-send framing overhead. Each
+# read is CHUNK_SIZE samples (128ms at 16kHz), so every extra frame adds 128ms
+# of latency before Gemini hears it
+FRAMES_PER_MESSAGE = int(os.getenv("AUDIO_FRAMES_PER_MESSAGE", "2"))
+PLAYBACK_QUEUE_SIZE = 64  # Decoded audio chunks buffered ahead of the playback thread
+MAX_CHAT_HISTORY = 10  # Chat entries (5 user/model exchanges) resent per gemini_session turn
+AUDIO_SEND_QUEUE_SIZE = 8  # Audio messages buffered between capture and the socket writer
+# Save the first received audio chunk to debug_output.wav (off by default)
+DEBUG_AUDIO = bool(os.getenv("NOVION_DEBUG_AUDIO"))
+
+# input() can sit blocked for the whole session, so stdin gets its own thread
+# instead of permanently holding a default-executor slot; mic reads get their
+# own thread too so they never queue behind other executor work
+_stdin_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="stdin")
+_audio_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio")
 
 # Add at the top with other globals
-mic_muted = False
+# Set while the mic is live; clearing it mutes, and the capture task then
+# idles on wait() instead of polling
+mic_unmuted = asyncio.Event()
+mic_unmuted.set()
 isConnected = False
 
 # ------------------------------------------------------------------------------
@@ -67,20 +119,28 @@ setup_message = {
         }
     }
 }
+# Serialized once; every Gemini connection opens with the same setup message
+SETUP_MESSAGE_JSON = json_dumps(setup_message)
+
+
+class SessionEnded(Exception):
+    """Raised by text_input_task when the user types 'exit', ending the session's task group."""
+
 
 async def main():
     async with websockets.connect(
-        uri
+        uri,
+        compression=None  # base64 audio barely deflates; skip zlib on every frame
     ) as websocket:
         # 1) Send the BidiGenerateContentSetup as JSON
-        await websocket.send(json.dumps(setup_message))
+        await websocket.send(SETUP_MESSAGE_JSON)
         print("Sent BidiGenerateContentSetup. Waiting for 'BidiGenerateContentSetupComplete'...")
 
         while True:
             init_resp = await websocket.recv()
 
             try:
-                data = json.loads(init_resp)
+                data = json_loads(init_resp)
             except json.JSONDecodeError:
         
                 print("Unexpected non-JSON response before setup complete.")
@@ -94,24 +154,22 @@ async def main():
                 # Could be an error or some other message.
                 print("Received unexpected message during setup:", data)
 
-        loop = asyncio.get_event_loop()
-        mic_task = loop.create_task(audio_capture_task(websocket))
-        text_task = loop.create_task(text_input_task(websocket))
-        receive_task = loop.create_task(receive_from_gemini(websocket))
-
-        # Wait until either the user types 'exit' or the connection closes
-        done, pending = await asyncio.wait(
-            [mic_task, text_task, receive_task],
-            return_when=asyncio.FIRST_COMPLETED
-        )
-
-        # Cancel any remaining tasks
-        for task in pending:
-            task.cancel()
+        # Wait until either the user types 'exit' or the connection closes;
+        # the task group cancels the remaining tasks as soon as one fails
+        audio_queue = asyncio.Queue(maxsize=AUDIO_SEND_QUEUE_SIZE)
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(audio_capture_task(audio_queue))
+                tg.create_task(audio_send_task(websocket, audio_queue))
+                tg.create_task(text_input_task(websocket))
+                tg.create_task(receive_from_gemini(websocket))
+        except* SessionEnded:
+            pass
+        except* websockets.exceptions.ConnectionClosed:
+            print("Connection to Gemini closed.")
 
-        # If user typed 'exit', we can close the websocket
-        if not websocket.closed:
-            await websocket.close()
+        # If user typed 'exit', we can close the websocket (a no-op if already closed)
+        await websocket.close()
         print("Session closed.")
 
 # ------------------------------------------------------------------------------
@@ -137,7 +195,26 @@ def build_text_message(user_input: str) -> str:
             "turn_complete": True
         }
     }
-    return json.dumps(msg)
+    return json_dumps(msg)
+
+#------------------------------------------------------------------------------
+# Tool calls
+# ------------------------------------------------------------------------------
+async def forward_tool_call(websocket, name: str, args):
+    """Hand a function call to the frontend, which runs the viewer/search tools."""
+    return await websocket.send_json({
+        "type": "tool_call",
+        "name": name,
+        "args": args
+    })
+
+
+# Function-call name -> handler; new tools are registered here rather than
+# as another branch in gemini_session
+_TOOL_HANDLERS = {
+    "searchMedicalImages": forward_tool_call,
+    "loadImageSeries": forward_tool_call,
+}
 
 #------------------------------------------------------------------------------
 # Main session
@@ -218,24 +295,23 @@ async def gemini_session(websocket):
         while isConnected:
             try:
                 message = await websocket.receive_text()
+                # Every send re-uploads the whole history; keep only the recent
+                # turns so prompt size (and time to first token) stays flat
+                if len(chat.history) > MAX_CHAT_HISTORY:
+                    history = chat.history[-MAX_CHAT_HISTORY:]
+                    # The trimmed history must still open on a user turn
+                    while history and history[0].role != "user":
+                        history = history[1:]
+                    chat.history = history
                 response = chat.send_message(message)
                 
                 if response.candidates[0].content.parts[0].function_call:
                     function_call = response.candidates[0].content.parts[0].function_call
                     result = None
                     
-                    if function_call.name == "searchMedicalImages":
-                        result = await websocket.send_json({
-                            "type": "tool_call",
-                            "name": "searchMedicalImages",
-                            "args": function_call.args
-                        })
-                    elif function_call.name == "loadImageSeries":
-                        result = await websocket.send_json({
-                            "type": "tool_call",
-                            "name": "loadImageSeries",
-                            "args": function_call.args
-                        })
+                    handler = _TOOL_HANDLERS.get(function_call.name)
+                    if handler:
+                        result = await handler(websocket, function_call.name, function_call.args)
                     
                     if result:
                         response = chat.send_message(result)
@@ -258,46 +334,38 @@ async def gemini_session(websocket):
         isConnected = False
 
 
+# {"streamInput": {"audio": {"data": <b64>, "encoding": "LINEAR16", "sampleRate": INPUT_SAMPLE_RATE}}}
+# split around the data field
+_AUDIO_MESSAGE_PREFIX = '{"streamInput":{"audio":{"data":"'
+_AUDIO_MESSAGE_SUFFIX = f'","encoding":"LINEAR16","sampleRate":{INPUT_SAMPLE_RATE}}}}}}}'
+
+
 def build_audio_chunk_message(chunk: bytes) -> str:
     """Properly format audio chunks for Gemini API"""
-    # Validate chunk size
-    if len(chunk) != CHUNK_SIZE * BYTES_PER_SAMPLE:
-        print(f"Warning: Invalid chunk size {len(chunk)}, expected {CHUNK_SIZE * BYTES_PER_SAMPLE}")
-        return None
-        
-    # Validate PCM data
-    try:
-        pcm_data = struct.unpack(f"<{CHUNK_SIZE}h", chunk)  # little-endian 16-bit samples
-        if any(sample < -32768 or sample > 32767 for sample in pcm_data):
-            print("Warning: Invalid PCM sample values detected")
-            return None
-    except struct.error as e:
-        print(f"Error unpacking PCM data: {e}")
+    # Validate chunk size; any whole number of samples is accepted, since
+    # audio_capture_task batches several CHUNK_SIZE reads per message
+    if not chunk or len(chunk) % BYTES_PER_SAMPLE:
+        print(f"Warning: Invalid chunk size {len(chunk)}, expected a multiple of {BYTES_PER_SAMPLE}")
         return None
-        
-    b64_data = base64.b64encode(chunk).decode("utf-8")
-    msg = {
-        "streamInput": {
-            "audio": {
-                "data": b64_data,
-                "encoding": "LINEAR16",
-                "sampleRate": INPUT_SAMPLE_RATE
-            }
-        }
-    }
-    return json.dumps(msg)
+
+    # No per-sample range check: any 16-bit little-endian sample is in range
+    # by construction, so walking all CHUNK_SIZE samples could never fail
+    # Base64 output never needs JSON escaping, so the message is spliced
+    # around the payload instead of building and serializing a dict per frame
+    b64_data = b64encode_audio(chunk).decode("ascii")
+    return _AUDIO_MESSAGE_PREFIX + b64_data + _AUDIO_MESSAGE_SUFFIX
 
 
 
 # ------------------------------------------------------------------------------
 # Task: capturing audio from the microphone at 16 kHz and sending to Gemini
 # ------------------------------------------------------------------------------
-async def audio_capture_task(ws: websockets.WebSocketClientProtocol):
+async def audio_capture_task(audio_queue: asyncio.Queue):
     """
     Continuously read from the microphone in small CHUNK_SIZE frames
-    and send them to Gemini only when connected and not muted.
+    and queue them for Gemini only when connected and not muted.
     """
-    global mic_muted
+    loop = asyncio.get_running_loop()
     pa = pyaudio.PyAudio()
     stream = pa.open(
         format=AUDIO_FORMAT,
@@ -306,14 +374,29 @@ async def audio_capture_task(ws: websockets.WebSocketClientProtocol):
         input=True,
         frames_per_buffer=CHUNK_SIZE
     )
+    pending = bytearray()
+    frames_pending = 0
     try:
         while True:
-            if not mic_muted and isConnected:  # Only send audio when not muted and connected
-                audio_chunk = stream.read(CHUNK_SIZE, exception_on_overflow=False)
-                msg_str = build_audio_chunk_message(audio_chunk)
+            await mic_unmuted.wait()
+            # stream.read blocks until CHUNK_SIZE frames are captured, which
+            # paces the loop; run it off the event loop so receiving isn't held up
+            audio_chunk = await loop.run_in_executor(_audio_executor, stream.read, CHUNK_SIZE, False)
+            if not isConnected:  # Only send audio when connected
+                continue
+            pending += audio_chunk
+            frames_pending += 1
+            if frames_pending >= FRAMES_PER_MESSAGE:
+                msg_str = build_audio_chunk_message(bytes(pending))
+                pending.clear()
+                frames_pending = 0
                 if msg_str:  # Only send if message was built successfully
-                    await ws.send(msg_str)
-            await asyncio.sleep(0.001)
+                    try:
+                        audio_queue.put_nowait(msg_str)
+                    except asyncio.QueueFull:
+                        # The socket is backed up; drop this frame rather than
+                        # let capture fall behind the microphone
+                        print("Warning: audio send queue full, dropping frame")
     except asyncio.CancelledError:
         pass
     finally:
@@ -321,6 +404,20 @@ async def audio_capture_task(ws: websockets.WebSocketClientProtocol):
         stream.close()
         pa.terminate()
 
+# ------------------------------------------------------------------------------
+# Task: sending queued audio messages to Gemini
+# ------------------------------------------------------------------------------
+async def audio_send_task(ws: websockets.WebSocketClientProtocol, audio_queue: asyncio.Queue):
+    """
+    Drain audio messages queued by audio_capture_task onto the socket, so
+    microphone capture never waits on websocket send backpressure.
+    """
+    try:
+        while True:
+            await ws.send(await audio_queue.get())
+    except asyncio.CancelledError:
+        pass
+
 # ------------------------------------------------------------------------------
 # Task: reading user text input from console and sending it as client_content
 # ------------------------------------------------------------------------------
@@ -332,12 +429,12 @@ async def text_input_task(ws: websockets.WebSocketClientProtocol):
     """
     loop = asyncio.get_running_loop()
     while True:
-        user_text = await loop.run_in_executor(None, input, "You: ")
+        user_text = await loop.run_in_executor(_stdin_executor, input, "You: ")
         if not user_text:
             continue
         if user_text.lower() == "exit":
             print("Exiting on user command...")
-            return
+            raise SessionEnded
         message_str = build_text_message(user_text)
         await ws.send(message_str)
 
@@ -436,6 +533,16 @@ async def fetch_and_analyze_medical_images(gemini_response: dict, api_key: str =
         return f"Error during medical imaging fetching and analysis: {e}"
 
 
+@functools.cache
+def _get_http_client() -> httpx.AsyncClient:
+    # One pooled client for all Open-i requests instead of a new client (and
+    # TLS handshake) per call; multiplexed over HTTP/2 when h2 is installed
+    return httpx.AsyncClient(
+        http2=_HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_keepalive_connections=10),
+    )
+
+
 async def get_images_from_api(keywords: str, api_key: str = None) -> tuple:
     """
     Searches and retrieves images from the NIH Open-i API based on the keywords given.
@@ -444,67 +551,67 @@ async def get_images_from_api(keywords: str, api_key: str = None) -> tuple:
     API Documentation: https://openi.nlm.nih.gov/api
     """
     try:
-        # Use httpx for async HTTP requests
-        async with httpx.AsyncClient() as client:
-            # NIH Open-i API base endpoint
-            base_url = "https://openi.nlm.nih.gov/api/search"
-            
-            # Construct query parameters
-            params = {
-                'query': keywords,      # Main search term
-                'n': '1',              # Start index
-                'm': '10',             # End index (retrieve up to 10 results)
-                'it': 'x,p,m',         # Image types: x-ray, photograph, medical image
-                'coll': 'pmc,iu,mca',  # Collections: PubMed Central, Indiana Univ, MCA
-                'fields': 't,a,msh',   # Search in title, abstract, MeSH terms
-            }
+        # Shared client, so image searches and downloads reuse pooled connections
+        client = _get_http_client()
+        # NIH Open-i API base endpoint
+        base_url = "https://openi.nlm.nih.gov/api/search"
+        
+        # Construct query parameters
+        params = {
+            'query': keywords,      # Main search term
+            'n': '1',              # Start index
+            'm': '10',             # End index (retrieve up to 10 results)
+            'it': 'x,p,m',         # Image types: x-ray, photograph, medical image
+            'coll': 'pmc,iu,mca',  # Collections: PubMed Central, Indiana Univ, MCA
+            'fields': 't,a,msh',   # Search in title, abstract, MeSH terms
+        }
+        
+        # Make the initial search request
+        response = await client.get(base_url, params=params)
+        response.raise_for_status()
+        search_results = response.json()
+        
+        # Check if we have any results
+        if not search_results or 'list' not in search_results:
+            print("No images found in search results")
+            return None, None, None
             
-            # Make the initial search request
-            response = await client.get(base_url, params=params)
-            response.raise_for_status()
-            search_results = response.json()
+        # Get the first image result
+        for result in search_results['list']:
+            if 'imgLarge' in result:
+                image_url = result['imgLarge']
+            elif 'imgThumb' in result:
+                image_url = result['imgThumb']
+            else:
+                continue
+                
+            # Fetch the actual image
+            img_response = await client.get(image_url)
+            img_response.raise_for_status()
+            image_data = img_response.content
             
-            # Check if we have any results
-            if not search_results or 'list' not in search_results:
-                print("No images found in search results")
-                return None, None, None
+            # Use PIL to validate and get image format
+            try:
+                image = Image.open(BytesIO(image_data))
+                image_format = image.format  # Returns 'JPEG', 'PNG', etc.
+                image_type = image.mode     # Returns 'RGB', 'RGBA', etc.
                 
-            # Get the first image result
-            for result in search_results['list']:
-                if 'imgLarge' in result:
-                    image_url = result['imgLarge']
-                elif 'imgThumb' in result:
-                    image_url = result['imgThumb']
-                else:
-                    continue
-                    
-                # Fetch the actual image
-                img_response = await client.get(image_url)
-                img_response.raise_for_status()
-                image_data = img_response.content
+                # Convert image to bytes if needed
+                if not isinstance(image_data, bytes):
+                    buffer = BytesIO()
+                    image.save(buffer, format=image_format)
+                    image_data = buffer.getvalue()
                 
-                # Use PIL to validate and get image format
-                try:
-                    image = Image.open(BytesIO(image_data))
-                    image_format = image.format  # Returns 'JPEG', 'PNG', etc.
-                    image_type = image.mode     # Returns 'RGB', 'RGBA', etc.
-                    
-                    # Convert image to bytes if needed
-                    if not isinstance(image_data, bytes):
-                        buffer = BytesIO()
-                        image.save(buffer, format=image_format)
-                        image_data = buffer.getvalue()
-                    
-                    return image_data, image_type, image_format.lower()
-                    
-                except Exception as e:
-                    print(f"Error processing image with PIL: {e}")
-                    continue
-            
-            # If we get here, we didn't find any valid images
-            print("No valid images found in search results")
-            return None, None, None
-            
+                return image_data, image_type, image_format.lower()
+                
+            except Exception as e:
+                print(f"Error processing image with PIL: {e}")
+                continue
+        
+        # If we get here, we didn't find any valid images
+        print("No valid images found in search results")
+        return None, None, None
+        
     except Exception as e:
         print(f"Error retrieving image from NIH Open-i API: {e}")
         return None, None, None
@@ -528,6 +635,7 @@ async def analyze_image_with_vision_api(image_data: bytes, image_type: str, imag
 # Task: receiving messages (JSON or binary) from Gemini and handling them
 # ------------------------------------------------------------------------------
 async def receive_from_gemini(ws: websockets.WebSocketClientProtocol):
+    loop = asyncio.get_running_loop()
     pa = pyaudio.PyAudio()
     
     playback_stream = pa.open(
@@ -538,21 +646,50 @@ async def receive_from_gemini(ws: websockets.WebSocketClientProtocol):
         frames_per_buffer=CHUNK_SIZE
     )
 
-    debug_wav = wave.open('debug_output.wav', 'wb')
-    debug_wav.setnchannels(NUM_CHANNELS)
-    debug_wav.setsampwidth(BYTES_PER_SAMPLE)
-    debug_wav.setframerate(OUTPUT_SAMPLE_RATE)
-    first_audio_saved = False
+    debug_wav = None
+    if DEBUG_AUDIO:
+        debug_wav = wave.open('debug_output.wav', 'wb')
+        debug_wav.setnchannels(NUM_CHANNELS)
+        debug_wav.setsampwidth(BYTES_PER_SAMPLE)
+        debug_wav.setframerate(OUTPUT_SAMPLE_RATE)
+    # Nothing to save unless debugging, so start as if it were already saved
+    first_audio_saved = not DEBUG_AUDIO
+
+    # playback_stream.write blocks until the device buffer drains, so it runs
+    # on its own thread fed by a jitter buffer; ws.recv() never waits on it
+    play_queue = queue.Queue(maxsize=PLAYBACK_QUEUE_SIZE)
+
+    def playback_worker():
+        while (audio_data := play_queue.get()) is not None:
+            try:
+                playback_stream.write(audio_data)
+            except Exception as e:
+                print(f"Error playing audio: {e}")
+
+    def queue_playback(audio_data: bytes):
+        try:
+            play_queue.put_nowait(audio_data)
+        except queue.Full:
+            print("Warning: playback queue full, dropping audio chunk")
+
+    player = threading.Thread(target=playback_worker, name="playback", daemon=True)
+    player.start()
 
     try:
         while True:
             msg = await ws.recv()
 
             if isinstance(msg, bytes):
-                try:
-                    text_msg = msg.decode('utf-8')
-                    data = json.loads(text_msg)
-                    
+                data = None
+                # Raw PCM frames skip the JSON parser; only frames that could
+                # be a JSON object are parsed (straight from the bytes)
+                if msg.startswith(b"{"):
+                    try:
+                        data = json_loads(msg)
+                    except (UnicodeDecodeError, json.JSONDecodeError):
+                        pass  # PCM that happens to start with "{"
+
+                if data is not None:
                     if "serverContent" in data:
                         content = data["serverContent"]
                         if "modelTurn" in content:
@@ -562,35 +699,36 @@ async def receive_from_gemini(ws: websockets.WebSocketClientProtocol):
                                     print("Gemini:", part["text"])
                                 elif "inlineData" in part:
                                     try:
-                                        audio_data = base64.b64decode(part["inlineData"]["data"])
+                                        audio_data = b64decode_audio(part["inlineData"]["data"])
                                         print(f"Received inline audio of size: {len(audio_data)} bytes")
                                         
                                         if not first_audio_saved:
-                                            debug_wav.writeframes(audio_data)
+                                            # Disk write off the event loop so it can't stall ws.recv()
+                                            await loop.run_in_executor(None, debug_wav.writeframes, audio_data)
                                             first_audio_saved = True
                                             print(f"Saved first audio chunk to debug_output.wav")
                                         
-                                        playback_stream.write(audio_data)
+                                        queue_playback(audio_data)
                                     except Exception as e:
                                         print(f"Error processing inline audio: {e}")
-                
-                except (UnicodeDecodeError, json.JSONDecodeError):
+
+                else:
                     # If not JSON, treat as raw PCM audio data
                     print(f"Received raw audio chunk of size: {len(msg)} bytes")
                     try:
                         if not first_audio_saved:
-                            debug_wav.writeframes(msg)
+                            await loop.run_in_executor(None, debug_wav.writeframes, msg)
                             first_audio_saved = True
                             print(f"Saved first audio chunk to debug_output.wav")
                         
-                        playback_stream.write(msg)
+                        queue_playback(msg)
                     except Exception as e:
                         print(f"Error playing audio: {e}")
                 
                 continue
 
             try:
-                data = json.loads(msg)
+                data = json_loads(msg)
                 if "serverContent" in data:
                     content = data["serverContent"]
                     if "modelTurn" in content:
@@ -606,7 +744,16 @@ async def receive_from_gemini(ws: websockets.WebSocketClientProtocol):
     except asyncio.CancelledError:
         pass
     finally:
-        debug_wav.close()
+        # Drop unplayed audio and stop the player before closing its stream
+        while True:
+            try:
+                play_queue.get_nowait()
+            except queue.Empty:
+                break
+        play_queue.put_nowait(None)
+        await loop.run_in_executor(None, player.join)
+        if debug_wav is not None:
+            debug_wav.close()
         playback_stream.stop_stream()
         playback_stream.close()
         pa.terminate()
@@ -615,20 +762,18 @@ async def handle_frontend_connection(websocket):
     """Handle WebSocket connections from the frontend."""
     print(f"Frontend client connected")
     try:
-        async with websockets.connect(uri) as gemini_ws:
+        async with websockets.connect(uri, compression=None) as gemini_ws:
             # Send setup message to Gemini
-            await gemini_ws.send(json.dumps(setup_message))
+            await gemini_ws.send(SETUP_MESSAGE_JSON)
             print("Sent setup message to Gemini")
 
             # Wait for setup completion
             while True:
                 init_resp = await gemini_ws.recv()
                 try:
-                    if isinstance(init_resp, bytes):
-                        init_resp = init_resp.decode('utf-8')
-                    data = json.loads(init_resp)
+                    data = json_loads(init_resp)  # str or bytes
                     if "setupComplete" in data:
-                        await websocket.send(json.dumps({"status": "connected"}))
+                        await websocket.send(json_dumps({"status": "connected"}))
                         break
                 except (json.JSONDecodeError, UnicodeDecodeError) as e:
                     print(f"Error parsing setup message: {e}")
@@ -645,25 +790,10 @@ async def handle_frontend_connection(websocket):
             async def forward_to_frontend():
                 try:
                     async for message in gemini_ws:
-                        if isinstance(message, bytes):
-                            try:
-                                # Try to decode bytes as UTF-8 JSON
-                                message = message.decode('utf-8')
-                                data = json.loads(message)
-                                await websocket.send(json.dumps(data))
-                            except (UnicodeDecodeError, json.JSONDecodeError):
-                                # If not valid JSON, send as base64 encoded binary
-                                await websocket.send(json.dumps({
-                                    "binary": base64.b64encode(message).decode('utf-8')
-                                }))
-                        else:
-                            # Regular JSON message
-                            try:
-                                data = json.loads(message)
-                                await websocket.send(json.dumps(data))
-                            except json.JSONDecodeError as e:
-                                print(f"Error parsing message: {e}")
-                                continue
+                        # Relayed untouched: the frontend parses binary frames
+                        # as JSON and falls back to raw PCM itself, so there's
+                        # no need to parse here or base64-wrap audio
+                        await websocket.send(message)
                 except websockets.exceptions.ConnectionClosed:
                     pass
 
@@ -675,7 +805,7 @@ async def handle_frontend_connection(websocket):
     except Exception as e:
         print(f"Error in connection handler: {e}")
         try:
-            await websocket.send(json.dumps({"error": str(e)}))
+            await websocket.send(json_dumps({"error": str(e)}))
         except:
             pass
     finally:
@@ -686,8 +816,14 @@ async def handle_frontend_connection(websocket):
 async def start_server():
     """Start the WebSocket server for frontend connections."""
     print(f"Starting WebSocket server on port {WEB_SERVER_PORT}")
-    async with serve(handle_frontend_connection, "localhost", WEB_SERVER_PORT):
-        await asyncio.Future()  # run forever
+    # No permessage-deflate: the relayed frames are mostly base64 audio, which
+    # barely compresses but would cost zlib CPU on both ends of every frame
+    try:
+        async with serve(handle_frontend_connection, "localhost", WEB_SERVER_PORT, compression=None):
+            await asyncio.Future()  # run forever
+    finally:
+        if _get_http_client.cache_info().currsize:
+            await _get_http_client().aclose()
 
 async def process_frontend_messages(websocket):
     """Process messages from frontend and forward them to Gemini."""
@@ -701,6 +837,14 @@ async def process_frontend_messages(websocket):
         print(f"Error processing frontend message: {e}")
 
 if __name__ == "__main__":
+    # uvloop's libuv-based loop speeds up the per-frame websocket send/recv;
+    # optional, and unavailable on Windows
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
+
     try:
         asyncio.run(start_server())
     except KeyboardInterrupt:
@@ -183,6 +183,7 @@ export function useGeminiConnection(): UseGeminiConnection {
             } catch (e) {
               // If not JSON, treat as raw PCM audio
               console.log('Received raw PCM audio data');
+              geminiEvents.emit('audio', arrayBuffer);
               queueAudio(arrayBuffer);
             }
             return;